@@ -1,8 +1,8 @@
-import smbus   
 import time
+import hardware
 
 
-bus = smbus.SMBus(1)
+bus = hardware.openSMBus(1)
 channels = [0x40, 0x41, 0x42, 0x43]
 
 
@@ -18,6 +18,15 @@ def read(chn):
     return bus.read_byte(address)
 
 
+# 自增模式一次读取 4 个通道: 控制字节后读 5 个字节, 第一个是上一次的转换结果。
+# Read all four channels in one block transaction using auto-increment mode.
+# The first of the five bytes read is the previous conversion and is dropped.
+def scan():
+    global address
+    data = bus.read_i2c_block_data(address, 0x44, 5)
+    return tuple(data[1:])
+
+
 def write(val):
     bus.write_byte_data(address, 0x40, int(val))
 
@@ -7,14 +7,15 @@ import sys
 import os
 import json
 import threading
+import queue
 import random
-from adafruit_motor import servo
-from adafruit_pca9685 import PCA9685
-import busio
-from board import SCL, SDA
-i2c = busio.I2C(SCL, SDA)
-pca = PCA9685(i2c, address=0x40) #default 0x40
-pca.frequency = 50
+import traceback
+import trajectory
+import planCompiler
+import setpointStream
+import servoDriver
+from servoCommands import Jog, Stop, Goto, Angle, RunPlan, Abort, Init, Setpoint, StreamEnd, LatencyStats
+from servoDriver import set_angle, stage, stagePulse, commit
 
 curPath = os.path.realpath(__file__)
 thisPath = '/' + os.path.dirname(curPath) + '/'
@@ -24,19 +25,50 @@ print(thisPath + 'plan.json')
 contentPlanGose  = planJsonFileHere.read()
 planGoseList = json.loads(contentPlanGose)
 
-# 设置舵机旋转角度
-# Set the servo rotation angle。
-def set_angle(ID, angle):
-    servo_angle = servo.Servo(pca.channels[ID], min_pulse=500, max_pulse=2400,actuation_range=180)
-    servo_angle.angle = angle
+# 控制循环的节拍统计 / Tick statistics of the control loop.
+class TickStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.overruns = 0 # 超出周期的节拍 / ticks that took longer than the period
+        self.jitterSum = 0.0
+        self.jitterMax = 0.0
+        self.busySum = 0.0
+        self.busyMax = 0.0
+
+    # jitter: 节拍开始时间与截止时间之差, busy: 计算与写入耗时。
+    # jitter: how late the tick started after its deadline, busy: time spent computing and writing.
+    def record(self, jitter, busy, overrun):
+        self.ticks += 1
+        self.jitterSum += jitter
+        self.busySum += busy
+        if jitter > self.jitterMax: self.jitterMax = jitter
+        if busy > self.busyMax: self.busyMax = busy
+        if overrun: self.overruns += 1
+
+    def stats(self):
+        ticks = max(self.ticks, 1)
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'jitterMean': self.jitterSum / ticks,
+            'jitterMax': self.jitterMax,
+            'busyMean': self.busySum / ticks,
+            'busyMax': self.busyMax,
+        }
 
 # 舵机控制
 # Servo control.
 class ServoCtrl(threading.Thread):
     def __init__(self, *args, **kwargs):
         super().__init__()
-        self.__flag = threading.Event()
-        self.__flag.clear()
+        # 其他线程只通过命令队列控制舵机, 运动状态只由控制线程修改。
+        # Other threads drive the servos only through the command queue; the motion state is owned by the control thread.
+        self.commands = queue.SimpleQueue()
+        self.commandLatency = {} # 每种命令从产生到执行的延迟 / per command type, latency from post to apply
+        self.active = False
         self.initAngle = [90,90,90,90, 90,90,90,90, 90,90,90,90, 90,90,90,90] # 16个舵机初始角度 / 16 servo initial angle
         self.goalAngle = [90,90,90,90, 90,90,90,90, 90,90,90,90, 90,90,90,90] # 目标角度 / target angle
         self.nowAngle = [90,90,90,90, 90,90,90,90, 90,90,90,90, 90,90,90,90] # 当前角度 / current angle
@@ -44,16 +76,37 @@ class ServoCtrl(threading.Thread):
         self.lastAngle = [90,90,90,90, 90,90,90,90, 90,90,90,90, 90,90,90,90] # 变化前的角度
 
         self.sc_direction = [1,1,1,1, 1,1,1,1, 1,1,1,1, 1,1,1,1] # 舵机正常转动为1，反向转动改为-1 / The normal rotation of the servo is 1, and the reverse rotation is changed to -1
-        self.scSpeed = [0,0,0,0, 0,0,0,0, 0,0,0,0, 0,0,0,0] # 舵机转动速度 / Servo rotation speed.
-        self.wiggleID = 0 # 舵机号 Servo ID
-        self.wiggleDirection = 1 # 自定义舵机转向,1:正转 -1:反转 / Custom servo steering, 1: Forward -1: Reverse
+        self.jogVelocity = [0.0]*16 # 每个舵机的转动速度 (度/秒), 可同时转动多个舵机 / per-servo jog velocity (deg/s); several servos can jog together
         self.maxAngle = 180
         self.minAngle = 0
         self.scMoveTime = 0.01
+        self.tickRate = 100 # 控制循环频率 (Hz), 如 50/100/200 / control loop rate (Hz), e.g. 50/100/200
+        self.jogRate = 100.0 # 速度为 1 时每秒转动的角度 / degrees per second at speed 1
+        self.motion = None # 正在执行的移动, 每个节拍前进一步 / the running move, advanced once per tick
+        self.tickStats = TickStats()
+        self.writeStamp = None # 最早一个还未写入寄存器的命令的时间 / stamp of the oldest command not yet written out
+        self.writeLatency = LatencyStats() # 从命令产生到寄存器写入 / from a command's stamp to the register write
         self.goalUpdate = 0
         self.scMode = "auto"
         self.scSteps = 30
         self.scTime = 2.0
+        self.scProfile = 'trapezoid' # 运动曲线 / motion profile: 'linear', 'trapezoid' or 'minjerk'
+        self.maxVelocity = [360.0]*16 # 每个舵机的最大速度 (度/秒), None 时按 scSteps 步移动 / per-servo velocity limit (deg/s); None moves in scSteps steps
+        self.maxAccel = [1800.0]*16 # 每个舵机的最大加速度 (度/秒²) / per-servo acceleration limit (deg/s²)
+        # 动作执行: 以 planBlend 度的圆角连续经过航点, planDwell 秒大于 0 时在航点停留。
+        # 航点也可写成 {"pos": [...], "blend": 度, "dwell": 秒} 单独设置。
+        # Plan execution: pass through waypoints continuously, rounding them within planBlend
+        # degrees; a positive planDwell (seconds) holds at each waypoint instead.
+        # A waypoint may also be {"pos": [...], "blend": degrees, "dwell": seconds}.
+        self.planBlend = 10.0
+        self.planDwell = 0.0
+        self.planCycle = {'planned': 0.0, 'measured': 0.0} # 动作周期 (秒) / plan cycle time (s)
+        # 流式设定值: 按网络抖动延迟 streamDelay (最小, 最大) 秒播放, 中断 streamHold 秒后结束。
+        # Streamed setpoints: played behind by the network jitter, within streamDelay (min, max)
+        # seconds; the stream ends once it has been dry for streamHold seconds.
+        self.stream = None
+        self.streamDelay = (0.05, 0.3)
+        self.streamHold = 0.25
         '''
         5-DOF 机械臂 / 5-DOF Robotic Arm
         '''
@@ -66,20 +119,110 @@ class ServoCtrl(threading.Thread):
         print(thisPath + 'plan.json')
         self.contentPlan  = self.planJsonFile.read()
         self.planSave = json.loads(self.contentPlan)
+        self.compilePlan(planGoseList)
 
-    '''
-    def set_angle(self, ID, angle):
-        servo_angle = servo.Servo(pca.channels[ID], min_pulse=500, max_pulse=2400,actuation_range=180)
-        servo_angle.angle = angle
-    '''
-
-    def pause(self):    # 阻塞线程 / blocking thread
+    def pause(self):    # 控制循环空闲, 等待下一个命令 / control loop goes idle until the next command
         #print("......................pause......................")
-        self.__flag.clear()
+        self.active = False
 
-    def resume(self):  # 恢复线程 / resume thread
+    def resume(self):  # 控制循环开始按节拍运行 / control loop starts ticking
         #print("resume")
-        self.__flag.set()
+        self.active = True
+
+    # 发送命令到控制循环, 任何线程都可调用且不会阻塞。
+    # Post a command to the control loop; safe to call from any thread and never blocks.
+    def post(self, command):
+        if command.stamp is None:
+            command = command._replace(stamp=time.monotonic())
+        self.commands.put(command)
+        return command
+
+    # 在控制线程中执行一个命令 / Apply a command on the control thread.
+    def apply(self, command):
+        if isinstance(command, Jog):
+            if self.scMode != "wiggle":
+                self.jogVelocity = [0.0]*16
+            if not self.jogVelocity[command.ID]:
+                self.bufferAngle[command.ID] = float(self.nowAngle[command.ID])
+            self.motion = None
+            self.jogVelocity[command.ID] = command.direction*self.sc_direction[command.ID]*command.speed*self.jogRate
+            self.scMode = "wiggle"
+            self.angleUpdate()
+            self.resume()
+        elif isinstance(command, Stop):
+            if self.scMode == "wiggle":
+                if command.ID is None:
+                    self.jogVelocity = [0.0]*16
+                else:
+                    self.jogVelocity[command.ID] = 0.0
+                if not any(self.jogVelocity):
+                    self.pause()
+                    self.angleUpdate()
+        elif isinstance(command, Goto):
+            self.motion = self.moveSteps(command.number, command.goalPos)
+            self.scMode = "auto"
+            self.resume()
+        elif isinstance(command, Angle):
+            # 移动进行中时以它的目标为基础, 之前的单舵机目标不会丢失。
+            # While a move is running its goal is the base, so earlier single-servo goals are kept.
+            number = max(5, command.ID + 1)
+            if self.scMode == "auto" and self.motion is not None:
+                goalPos = list(self.goalAngle[:number])
+            else:
+                goalPos = list(self.nowAngle[:number])
+            goalPos[command.ID] = command.angle
+            self.motion = self.moveSteps(number, goalPos)
+            self.scMode = "auto"
+            self.resume()
+        elif isinstance(command, RunPlan):
+            self.motion = self.planGoes(command.plan)
+            self.scMode = 'planMove'
+            self.resume()
+        elif isinstance(command, Abort):
+            self.scMode = 'stop'
+            self.motion = None
+            self.pause()
+        elif isinstance(command, Init):
+            self.motion = None
+            self.moveInit()
+        elif isinstance(command, Setpoint):
+            if self.scMode != 'stream' or not self.active:
+                self.stream = setpointStream.JitterBuffer(self.streamDelay[0], self.streamDelay[1], self.streamHold)
+                self.motion = None
+                self.jogVelocity = [0.0]*16
+                for ID in range(0, 16):
+                    self.bufferAngle[ID] = float(self.nowAngle[ID])
+                self.scMode = 'stream'
+            self.stream.push(command.t, command.angles, command.stamp)
+            self.resume()
+        elif isinstance(command, StreamEnd):
+            if self.scMode == 'stream' and self.stream is not None:
+                self.stream.end()
+        name = type(command).__name__
+        if name not in self.commandLatency:
+            self.commandLatency[name] = LatencyStats()
+        self.commandLatency[name].record(time.monotonic() - command.stamp)
+        if self.writeStamp is None:
+            self.writeStamp = command.stamp
+
+    # 每个节拍执行一次, 取出队列中所有待执行的命令。
+    # Called once per tick: apply every queued command.
+    def drainCommands(self):
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            self.apply(command)
+
+    # 获取命令延迟统计 / Get the command latency statistics.
+    def commandStats(self):
+        return dict((name, self.commandLatency[name].stats()) for name in list(self.commandLatency))
+
+    # 从输入 (命令的 stamp) 到舵机寄存器写入的延迟统计。
+    # Latency from the input (the command's stamp) to the servo register write.
+    def latencyStats(self):
+        return self.writeLatency.stats()
 
     # 更新舵机舵机角度值. / Update the servo angle value of the servo.
     def angleUpdate(self):
@@ -88,6 +231,15 @@ class ServoCtrl(threading.Thread):
             self.lastAngle[i] = self.nowAngle[i]
         self.goalUpdate = 0
     
+    # 获取写入合并的统计: hits 为跳过的写入, misses 为实际写入。
+    # Get the write coalescing counters: hits are skipped writes, misses are real writes.
+    def writeStats(self):
+        return servoDriver.stats()
+
+    # 获取控制循环的节拍统计 / Get the tick statistics of the control loop.
+    def loopStats(self):
+        return self.tickStats.stats()
+
     # 获取舵机角度 / Get the servo angle.
     def servoAngle(self):
         #print("servoAngle():")
@@ -95,11 +247,12 @@ class ServoCtrl(threading.Thread):
     # 初始化所有舵机角度/ Initialize all servo angles.
     def moveInit(self):
         for i in range(0, 16):
-            set_angle(i, self.initAngle[i])
+            stage(i, self.initAngle[i])
             self.lastAngle[i] = self.initAngle[i]
             self.nowAngle[i] = self.initAngle[i]
             self.bufferAngle[i] = float(self.initAngle[i])
             self.goalAngle[i] = self.initAngle[i]
+        commit()
         self.pause()
 
     def initConfig(self, ID, initInput, moveTo):
@@ -109,64 +262,109 @@ class ServoCtrl(threading.Thread):
                 set_angle(ID, self.initAngle[ID])
             else:
                 print("initAngle Value Error.")
-    # 舵机向某个方向转动 / The servo turns in a certain direction.
+    # 所有正在转动的舵机各前进一步, 同一帧写入。到达极限的舵机停止, 全部停止后进入空闲。
+    # Advance every jogging servo by one tick, all in the same frame. A servo stops at its
+    # limit, and the loop goes idle once none is moving.
     def moveWiggle(self): 
-        self.bufferAngle[self.wiggleID] += self.wiggleDirection*self.sc_direction[self.wiggleID]*self.scSpeed[self.wiggleID]
-        if self.bufferAngle[self.wiggleID] > self.maxAngle: self.bufferAngle[self.wiggleID] = self.maxAngle
-        elif self.bufferAngle[self.wiggleID] < self.minAngle: self.bufferAngle[self.wiggleID] = self.minAngle
-        newNow = int(round(self.bufferAngle[self.wiggleID],0))
-        self.nowAngle[self.wiggleID] = newNow
-        self.lastAngle[self.wiggleID] = newNow
-        if self.bufferAngle[self.wiggleID] < self.maxAngle and self.bufferAngle[self.wiggleID] > self.minAngle:
-            set_angle(self.wiggleID, self.nowAngle[self.wiggleID])
-        else:
-            self.stopWiggle()
-        time.sleep(self.scMoveTime)
+        for ID in range(0, 16):
+            if not self.jogVelocity[ID]:
+                continue
+            self.bufferAngle[ID] += self.jogVelocity[ID]/self.tickRate
+            if self.bufferAngle[ID] >= self.maxAngle:
+                self.bufferAngle[ID] = self.maxAngle
+                self.jogVelocity[ID] = 0.0
+            elif self.bufferAngle[ID] <= self.minAngle:
+                self.bufferAngle[ID] = self.minAngle
+                self.jogVelocity[ID] = 0.0
+            newNow = int(round(self.bufferAngle[ID],0))
+            self.nowAngle[ID] = newNow
+            self.lastAngle[ID] = newNow
+            stage(ID, newNow)
+        if not any(self.jogVelocity):
+            self.pause()
+            self.angleUpdate()
         #print(self.servoAngle())
 
-    # 设置某个舵机旋转到多少度. / Set the angle to which a certain servo rotates.
+    # 按播放时间插值出的设定值移动舵机, 每个节拍的变化不超过 maxVelocity。数据中断后保持位置, 流结束后进入空闲。
+    # Move to the setpoint interpolated at the playout time, never faster than maxVelocity per
+    # tick. The position is held while the stream is dry, and the loop goes idle when it ends.
+    def moveStream(self):
+        now = time.monotonic()
+        angles = self.stream.sample(now)
+        if angles is not None:
+            for ID in range(0, min(len(angles), 16)):
+                goal = min(max(angles[ID], self.minAngle), self.maxAngle)
+                if self.maxVelocity is not None:
+                    step = self.maxVelocity[ID]/self.tickRate
+                    goal = min(max(goal, self.bufferAngle[ID] - step), self.bufferAngle[ID] + step)
+                self.bufferAngle[ID] = goal
+                self.nowAngle[ID] = int(round(goal))
+                stage(ID, goal)
+        if self.stream.finished(now):
+            self.pause()
+            self.angleUpdate()
+
+    # 设置某个舵机旋转到多少度 (相对初始角度), 由控制循环执行。
+    # Set the angle to which a certain servo rotates, relative to its initial angle; run by the control loop.
     def moveAngle(self,ID, angleInput):
-        self.nowAngle[ID] = int(self.initAngle[ID] + angleInput)
-        if self.nowAngle[self.wiggleID] > self.maxAngle: self.nowAngle[self.wiggleID] = self.maxAngle
-        elif self.nowAngle[self.wiggleID] < self.minAngle: self.nowAngle[self.wiggleID]
-        self.lastAngle[self.wiggleID] = self.nowAngle[self.wiggleID]
-        set_angle(ID, self.nowAngle[self.wiggleID])
-
-    # 停止转动. / Stop turning.
-    def stopWiggle(self):
-        self.pause()
-        self.angleUpdate()
+        self.moveJoint(ID, min(max(self.initAngle[ID] + angleInput, self.minAngle), self.maxAngle))
+
+    # 停止转动, 不指定 ID 时全部停止. / Stop turning; all servos when no ID is given.
+    def stopWiggle(self, ID=None, stamp=None):
+        self.post(Stop(ID, stamp))
     
-    # 设置某个舵机转动 / Set a single servo rotation.
-    def singleServo(self, ID, directInput, speedSet): 
-        self.wiggleID = ID
-        self.wiggleDirection = directInput
-        self.scSpeed[ID] = speedSet
-        self.scMode = "wiggle"
-        self.angleUpdate()
-        self.resume()
+    # 设置某个舵机转动, stamp 为输入产生的时间 / Set a single servo rotation; stamp is when the input happened.
+    def singleServo(self, ID, directInput, speedSet, stamp=None): 
+        self.post(Jog(ID, directInput, speedSet, stamp))
     
-    # 移动所有舵机到指定位置 / Move all servos to the specified position.
+    # 流式设定值, t 为客户端的时间 (秒), 控制循环按节拍插值 / Stream a setpoint at client time t (s); the control loop interpolates it per tick.
+    def streamSetpoint(self, t, angles, stamp=None):
+        self.post(Setpoint(t, list(angles), stamp))
+
+    # 播放完已收到的设定值后结束流 / End the stream once the buffered setpoints are played.
+    def streamStop(self, stamp=None):
+        self.post(StreamEnd(stamp))
+
+    # 获取当前 (或上一个) 流的统计 / Get the statistics of the current (or last) stream.
+    def streamStats(self):
+        if self.stream is None:
+            return {}
+        return self.stream.stats()
+
+    # 一个舵机转到指定角度, 由控制循环并入正在进行的移动 / Move one servo to an angle; the control loop merges it into the running move.
+    def moveJoint(self, ID, angle, stamp=None):
+        self.post(Angle(ID, angle, stamp))
+
+    # 移动所有舵机到指定位置, 由控制循环执行 / Move all servos to the specified position; run by the control loop.
     def moveToPos(self, number, goalPos):
         if isinstance(goalPos, list):
-            for i in range(0, len(goalPos)):
-                self.goalAngle[i] = goalPos[i]
-            for i in range(0, self.scSteps):
-                for dc in range(0, number):
-                    if not self.goalUpdate and self.goalAngle[dc] != self.nowAngle[dc]:
-                        self.nowAngle[dc] = int(round((self.lastAngle[dc] + ((self.goalAngle[dc] - self.lastAngle[dc])/self.scSteps)*(i+1)), 0))
-                        set_angle(dc, self.nowAngle[dc])
-                        time.sleep(self.scMoveTime)
-                        #print(self.nowAngle[dc])
-                    #if self.goalAngle != goalPos:
-                    #   self.angleUpdate()
-                    #   time.sleep(self.scTime/self.scSteps)
-                    #   print("???")
-            self.angleUpdate()
-            self.pause()
+            self.post(Goto(number, list(goalPos)))
         else:
             print("goalPos not an array")
 
+    # 预先计算整个移动的设定值矩阵, 每个节拍输出一行, 由 tick() 统一写入。
+    # 路径在调用时立即规划, goalAngle 随即更新, 同一节拍中后到的命令可以以它为基础。
+    # Precompute the setpoint matrix of the whole move and stream one row per tick; tick() commits the frame.
+    # The path is planned on the call, so goalAngle is current for a later command in the same tick.
+    def moveSteps(self, number, goalPos):
+        return self.streamRows(number, self.movePath(number, goalPos))
+
+    def movePath(self, number, goalPos):
+        for i in range(0, len(goalPos)):
+            self.goalAngle[i] = min(max(goalPos[i], self.minAngle), self.maxAngle)
+        path = trajectory.plan(self.nowAngle[:number], self.goalAngle[:number], self.tickRate, self.scProfile,
+                               None if self.maxVelocity is None else self.maxVelocity[:number],
+                               None if self.maxAccel is None else self.maxAccel[:number], self.scSteps)
+        return trajectory.rows(path)
+
+    def streamRows(self, number, rows):
+        for row in rows:
+            for dc in range(0, number):
+                self.nowAngle[dc] = row[dc]
+                stage(dc, row[dc])
+            yield
+        self.angleUpdate()
+
     '''
     5_DOF Robotic Arm
     '''
@@ -178,6 +376,7 @@ class ServoCtrl(threading.Thread):
         file2write.write(content2write)
         print(content2write)
         file2write.close()
+        self.compilePlan(planGoseList) # 保存时编译, 执行时直接读取 / compile on save so running it only maps the table
         
     # 新建一个机械臂动作。
     # Create a new plan.
@@ -196,47 +395,176 @@ class ServoCtrl(threading.Thread):
 
     # 中止动作的执行。
     # Abort the execution of the plan.
-    def moveThreadingStop(self):
-        self.scMode = 'stop'
-        self.pause()
+    def moveThreadingStop(self, stamp=None):
+        self.post(Abort(stamp))
 
-    # 开始执行机械臂动作。
-    # Start to execute the robotic arm motion.
-    def planThreadingStart(self):
-        self.scMode = 'planMove'
-        self.resume()
-
-    # 执行机械臂动作。
-    # execute the robotic arm motion.
-    def planGoes(self):
-        self.scMode = 'planMove'
-        if isinstance(planGoseList, list):
-            for goalPos in planGoseList:
-                if self.scMode == 'stop':
-                    self.pause()
-                    break
-                print(goalPos)
-                self.moveToPos(5, goalPos) # (number, goalPos)--(5 servos, an array of angle values)
-                time.sleep(1) # 
+    # 开始执行机械臂动作, 执行的是此刻保存的动作。
+    # Start to execute the robotic arm motion, as saved at this moment.
+    def planThreadingStart(self, stamp=None):
+        self.post(RunPlan(list(planGoseList), stamp))
+
+    # 航点的位置、圆角半径和停留时间。少于 5 个角度的航点 (手工编辑的 plan.json) 用 previous
+    # (上一个航点, 没有时为初始角度) 补齐, 与逐点移动时其余舵机保持不动一致。
+    # Position, blend radius and dwell of a waypoint. A waypoint with fewer than 5 angles (a
+    # hand-edited plan.json) is padded from `previous` (the waypoint before it, or the initial
+    # angles), so the other servos stay where they are as they did when moving point by point.
+    def planPoint(self, goalPos, previous=None):
+        blend, dwell = self.planBlend, self.planDwell
+        if isinstance(goalPos, dict):
+            blend = goalPos.get('blend', blend)
+            dwell = goalPos.get('dwell', dwell)
+            goalPos = goalPos['pos']
+        goalPos = list(goalPos[:5]) + list((self.initAngle if previous is None else previous)[len(goalPos):5])
+        pos = [min(max(angle, self.minAngle), self.maxAngle) for angle in goalPos]
+        return pos, blend, dwell
+
+    # 全部航点的位置、圆角半径和停留时间 / Positions, blend radii and dwells of every waypoint.
+    def planPoints(self, plan):
+        waypoints, blends, dwells = [], [], []
+        for goalPos in plan:
+            pos, blend, dwell = self.planPoint(goalPos, waypoints[-1] if waypoints else None)
+            waypoints.append(pos)
+            blends.append(blend)
+            dwells.append(dwell)
+        return waypoints, blends, dwells
+
+    # 获取动作周期: planned 为规划时间, measured 为上一次实际执行时间。
+    # Get the plan cycle time: planned is the planned duration, measured the last real run.
+    def planStats(self):
+        return dict(self.planCycle)
+
+    # 影响动作表的全部参数 / Everything a compiled plan table depends on.
+    def planCalibration(self):
+        return {
+            'servo': servoDriver.driver.calibration(),
+            'tickRate': self.tickRate,
+            'profile': self.scProfile,
+            'maxVelocity': self.maxVelocity,
+            'maxAccel': self.maxAccel,
+            'steps': self.scSteps,
+            'blend': self.planBlend,
+            'dwell': self.planDwell,
+            'range': [self.minAngle, self.maxAngle],
+        }
+
+    # 将动作编译为每个节拍的脉宽表, 路径从第一个航点开始, 已编译时直接映射缓存文件。
+    # 动作无法编译时 (如 plan.json 内容错误) 打印原因并返回 None, 执行时逐个航点移动。
+    # Compile a plan into a per-tick pulse table starting at its first waypoint; a cached table is mapped directly.
+    # A plan that cannot be compiled (e.g. a broken plan.json) is reported and gives None, and
+    # running it then moves from waypoint to waypoint.
+    def compilePlan(self, plan):
+        try:
+            key = planCompiler.cacheKey(plan, self.planCalibration())
+            table = planCompiler.load(key)
+            if table is not None or not plan:
+                return table
+            waypoints, blends, dwells = self.planPoints(plan)
+            dwells[0] = 0.0
+            path = trajectory.blend(waypoints, self.tickRate, self.scProfile,
+                                    None if self.maxVelocity is None else self.maxVelocity[:5],
+                                    None if self.maxAccel is None else self.maxAccel[:5], blends, dwells, self.scSteps)
+            angles = trajectory.rows(path)
+            if not angles: # 只有一个航点或航点都相同: 只移动到第一个航点 / one or identical waypoints: approach only
+                return None
+            pulses = [[servoDriver.driver.angleToPulse(dc, row[dc]) for dc in range(0, 5)] for row in angles]
+            return planCompiler.save(key, pulses, angles, 5)
+        except Exception as e:
+            print("plan not compiled, running it point by point: %r" % e)
+            return None
+
+    # 执行机械臂动作: 先移动到第一个航点, 再逐节拍写入编译好的脉宽表, 热路径上没有计算。
+    # execute the robotic arm motion: move to the first waypoint, then write the compiled
+    # pulse table one row per tick, with no math on the hot path.
+    def planGoes(self, plan=None):
+        if plan is None:
+            plan = planGoseList
+        if isinstance(plan, list):
+            if not plan:
+                return
+            start = time.monotonic()
+            table = self.compilePlan(plan)
+            waypoints = self.planPoints(plan)[0]
+            approach = self.movePath(5, waypoints[0])
+            self.planCycle['planned'] = (len(approach) + (table.ticks if table else 0)) / float(self.tickRate)
+            print("plan cycle time: %.2f s" % self.planCycle['planned'])
+            yield from self.streamRows(5, approach)
+            if table is not None:
+                for pulses, angles in zip(table.pulses.tolist(), table.angles.tolist()):
+                    for dc in range(0, 5):
+                        stagePulse(dc, pulses[dc])
+                    self.nowAngle[0:5] = angles
+                    yield
+            else:
+                for pos in waypoints[1:]:
+                    yield from self.streamRows(5, self.movePath(5, pos))
+            for dc in range(0, 5):
+                self.goalAngle[dc] = self.nowAngle[dc]
+            self.angleUpdate()
+            self.planCycle['measured'] = time.monotonic() - start
+            print("plan cycle time measured: %.2f s" % self.planCycle['measured'])
         else:
             print("planGoseList is not an array, and the content saved in the plan.json file is incorrect.")
 
-    # 舵机控制模式
-    # Servo control mode.
+    # 舵机控制模式, 每个节拍调用一次
+    # Servo control mode, called once per tick.
     def scMove(self):
         if self.scMode == "init":
             self.moveInit()
         elif self.scMode == "wiggle":
             self.moveWiggle()
-        elif self.scMode == 'planMove':
-            self.planGoes()
+        elif self.scMode == 'stream':
+            self.moveStream()
+        elif self.scMode in ('auto', 'planMove'):
+            if self.motion is None or next(self.motion, 'done') == 'done':
+                self.motion = None
+                self.pause()
         if self.scMode == 'stop':
             self.pause()
 
+    # 一个控制节拍: 执行队列中的命令, 计算所有舵机的设定值并一次写入。
+    # One control tick: apply queued commands, compute every servo's setpoint and commit them once.
+    def tick(self):
+        self.drainCommands()
+        if self.active:
+            self.scMove()
+        if commit() and self.writeStamp is not None:
+            self.writeLatency.record(time.monotonic() - self.writeStamp)
+            self.writeStamp = None
+
+    # 执行一个命令或节拍。出错时打印并丢弃, 停止当前运动, 控制循环继续运行。
+    # Apply a command or run a tick. An error is printed and dropped and the current motion
+    # stops, but the control loop keeps running.
+    def safely(self, func, *args):
+        try:
+            func(*args)
+        except Exception:
+            traceback.print_exc()
+            self.motion = None
+            self.jogVelocity = [0.0]*16
+            for ID in range(0, 16):
+                self.bufferAngle[ID] = float(self.nowAngle[ID])
+            self.pause()
+
+    # 空闲时阻塞等待命令; 运行时按 time.monotonic 截止时间以固定频率运行, 与总线耗时无关。
+    # Block for a command while idle; while active, run at a fixed rate on time.monotonic
+    # deadlines, however long the bus writes take.
     def run(self):
         while True:
-            self.__flag.wait()
-            self.scMove()
+            self.safely(self.apply, self.commands.get())
+            deadline = time.monotonic()
+            while self.active:
+                period = 1.0 / self.tickRate
+                start = time.monotonic()
+                self.safely(self.tick)
+                deadline += period
+                now = time.monotonic()
+                overrun = now > deadline
+                self.tickStats.record(start - (deadline - period), now - start, overrun)
+                if overrun:
+                    deadline = now # 不补偿错过的节拍 / do not burst to catch up on missed ticks
+                else:
+                    time.sleep(deadline - now)
+            self.writeStamp = None # 没有引起写入的命令不计入 / commands that wrote nothing are not counted
 
 if __name__ == "__main__":
     sc = ServoCtrl()
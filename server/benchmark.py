@@ -0,0 +1,471 @@
+#!/usr/bin/python3
+# File name   : benchmark.py
+# Description : Micro-benchmarks for the servo control path.
+# Usage       : python3 benchmark.py [name ...]
+#               ROBOT_HW=sim python3 benchmark.py [name ...]
+#               ROBOT_TRACE=<trace> replays a recorded joystick trace in the 'replay' benchmark.
+import os
+import sys
+import time
+import hardware
+
+
+def timePerCall(func, count):
+    start = time.perf_counter()
+    for i in range(0, count):
+        func(i)
+    return (time.perf_counter() - start) / count
+
+
+def report(name, before, after):
+    print("%-10s before: %8.1f us/call   after: %8.1f us/call   (x%.1f)" % (name, before * 1e6, after * 1e6, before / after))
+
+
+# 每次写入重建 servo.Servo 与复用缓存对象的耗时对比。
+# Per-write cost of rebuilding servo.Servo versus reusing the cached channel object.
+def benchServo(count=500):
+    from adafruit_motor import servo
+    from servoDriver import pca, driver, servoConfig
+    min_pulse, max_pulse, actuation_range = servoConfig[0]
+
+    def rebuild(i):
+        servo_angle = servo.Servo(pca.channels[0], min_pulse=min_pulse, max_pulse=max_pulse, actuation_range=actuation_range)
+        servo_angle.angle = i % actuation_range
+
+    def cached(i):
+        driver.set_angle(0, i % actuation_range)
+
+    report("servo", timePerCall(rebuild, count), timePerCall(cached, count))
+
+
+# 5 个关节 30 步的移动: 逐个写入与整帧写入的对比。
+# A 5-joint, 30-step move: one write per joint versus one frame per step.
+def benchFrame(joints=5, steps=30):
+    from servoDriver import driver
+
+    def single(i):
+        for ID in range(0, joints):
+            driver.set_angle(ID, 60 + i % steps)
+
+    def frame(i):
+        for ID in range(0, joints):
+            driver.stage(ID, 60 + i % steps)
+        driver.commit()
+
+    report("frame", timePerCall(single, steps), timePerCall(frame, steps))
+
+
+# 执行保存的动作, 统计被合并掉的写入。
+# Run the saved plan and count the writes dropped by coalescing.
+def benchCoalesce():
+    import RPIservo
+    import servoDriver
+    sc = RPIservo.ServoCtrl()
+    sc.moveInit()
+    servoDriver.driver.resetStats()
+    for goalPos in RPIservo.planGoseList:
+        sc.moveToPos(5, goalPos)
+        sc.tick()
+        while sc.active:
+            sc.tick()
+    stats = sc.writeStats()
+    total = stats['hits'] + stats['misses']
+    print("%-10s %d channel writes, %d skipped (%.0f%%), %d transactions" % ("coalesce", total, stats['hits'], 100.0 * stats['hits'] / max(total, 1), stats['transactions']))
+    if hardware.BACKEND == 'sim':
+        bus = servoDriver.pca.bus.stats()
+        print("%-10s simulated bus: %d bytes, %.1f ms" % ("", bus['bytes'], bus['busTime'] * 1000))
+
+
+# 以不同频率运行控制循环, 统计抖动和超时。
+# Run the control loop at several rates and report jitter and overruns.
+def benchLoop(seconds=1.0):
+    import RPIservo
+    sc = RPIservo.ServoCtrl()
+    sc.moveInit()
+    sc.daemon = True
+    sc.start()
+    for rate in (50, 100, 200):
+        sc.tickRate = rate
+        sc.tickStats.reset()
+        sc.singleServo(0, 1, 0.1)
+        time.sleep(seconds)
+        sc.stopWiggle()
+        stats = sc.loopStats()
+        print("%-10s %3d Hz: %d ticks, %d overruns, jitter mean %.3f ms max %.3f ms, busy mean %.3f ms" % ("loop", rate, stats['ticks'], stats['overruns'], stats['jitterMean'] * 1000, stats['jitterMax'] * 1000, stats['busyMean'] * 1000))
+
+
+# 逐步计算插值与预先计算整个设定值矩阵的对比, 以及各运动曲线的移动时间。
+# Per-step interpolation versus the precomputed setpoint matrix, and move duration per profile.
+def benchTrajectory(steps=30, rate=100):
+    import trajectory
+    start = [90, 90, 90, 90, 90]
+    goal = [0, 150, 60, 120, 90]
+
+    def perStep(i):
+        now = list(start)
+        for n in range(0, steps):
+            for dc in range(0, len(goal)):
+                if goal[dc] != now[dc]:
+                    now[dc] = int(round((start[dc] + ((goal[dc] - start[dc])/steps)*(n+1)), 0))
+
+    def precomputed(i):
+        for row in trajectory.rows(trajectory.plan(start, goal, rate, 'linear', None, None, steps)):
+            for dc in range(0, len(goal)):
+                row[dc]
+
+    report("trajectory", timePerCall(perStep, 200), timePerCall(precomputed, 200))
+    for profile in trajectory.PROFILES:
+        path = trajectory.plan(start, goal, rate, profile, 360.0, 1800.0)
+        print("%-10s %-9s %3d ticks, %.2f s" % ("", profile, len(path), len(path) / float(rate)))
+
+
+# 动作周期: 每个航点停 1 秒与连续圆角经过的对比。
+# Plan cycle time: stopping for 1 s at every waypoint versus blending through them.
+def benchPlan():
+    import RPIservo
+    sc = RPIservo.ServoCtrl()
+    sc.daemon = True
+    sc.start()
+    for blend, dwell in ((0.0, 1.0), (0.0, 0.0), (10.0, 0.0), (30.0, 0.0)):
+        sc.post(RPIservo.Init())
+        sc.planBlend, sc.planDwell = blend, dwell
+        sc.planThreadingStart()
+        time.sleep(0.05)
+        while sc.active:
+            time.sleep(0.05)
+        stats = sc.planStats()
+        print("%-10s blend %4.1f deg, dwell %.1f s: planned %.2f s, measured %.2f s" % ("plan", blend, dwell, stats['planned'], stats['measured']))
+
+
+# 多个线程同时发送命令, 统计从发送到执行的延迟。
+# Several threads post commands at once; report the latency from post to apply.
+def benchCommands(producers=4, count=200):
+    import threading
+    import RPIservo
+    sc = RPIservo.ServoCtrl()
+    sc.moveInit()
+    sc.daemon = True
+    sc.start()
+
+    def produce(ID):
+        for i in range(0, count):
+            sc.singleServo(ID, 1 if i % 2 else -1, 0.5)
+            time.sleep(0.002)
+        sc.stopWiggle()
+
+    threads = [threading.Thread(target=produce, args=(ID,)) for ID in range(0, producers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    time.sleep(0.1)
+    for name, stats in sc.commandStats().items():
+        print("%-10s %-5s %5d commands, p50 %.2f ms, p99 %.2f ms, max %.2f ms" % ("commands", name, stats['count'], stats['p50'] * 1000, stats['p99'] * 1000, stats['max'] * 1000))
+
+
+# 摇杆一次读取: 8 次 ADC.read() 与一次 ADC.scan() 的对比。
+# One joystick poll: eight ADC.read() calls versus one ADC.scan().
+def benchADC(count=200):
+    import PCF8591 as ADC
+    ADC.setup(0x48)
+
+    def reads(i):
+        for chn in (1, 1, 0, 0, 2, 2, 3, 3):
+            ADC.read(chn)
+
+    def scan(i):
+        ADC.scan()
+
+    report("adc", timePerCall(reads, count), timePerCall(scan, count))
+    if hardware.BACKEND == 'sim':
+        bus = ADC.bus.bus
+        before = bus.transactions
+        reads(0)
+        middle = bus.transactions
+        scan(0)
+        print("%-10s %d transactions per poll before, %d after" % ("", middle - before, bus.transactions - middle))
+
+
+# 摇杆处理: 每个样本经过滤波、查表到发送命令的耗时。
+# Joystick pipeline: time from one sample through the filters and the mapping table to the commands.
+def benchInput(count=2000):
+    import inputDevice
+
+    class Counter:
+        def __init__(self):
+            self.commands = 0
+
+        def singleServo(self, ID, direction, speed, stamp=None):
+            self.commands += 1
+
+        def stopWiggle(self, ID=None, stamp=None):
+            self.commands += 1
+
+    target = Counter()
+    layers = {'': {axis: inputDevice.AxisMap(axis, 1) for axis in range(0, 4)}}
+    joystick = inputDevice.Joystick(target, layers, report=None)
+    sweep = [[(i * 7 + 64 * axis) % 256 for axis in range(0, 4)] for i in range(0, 256)]
+    samples = [inputDevice.Sample(i, 0.0, sweep[i % 256]) for i in range(0, count)]
+
+    def handle(i):
+        joystick.handle(samples[i])
+
+    perSample = timePerCall(handle, count)
+    print("%-10s %8.1f us/sample, %d commands for %d samples" % ("input", perSample * 1e6, target.commands, count))
+
+
+# 回放摇杆记录, 统计从采样到处理、到命令执行、到舵机寄存器写入的延迟。
+# 没有 ROBOT_TRACE 时生成一段固定的记录, 每次结果可比。
+# Replay a joystick trace and report latency from the sample to its handling, to the command
+# being applied and to the servo register write. Without ROBOT_TRACE a fixed synthetic trace
+# is recorded first, so runs are comparable.
+def benchReplay(speed=1.0):
+    import tempfile
+    import threading
+    import RPIservo
+    import inputDevice
+    path = os.environ.get('ROBOT_TRACE')
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), 'synthetic.trace')
+        recorder = inputDevice.TraceRecorder(path)
+        for i in range(0, 800): # 4 秒, 200Hz / 4 s at 200 Hz
+            phase = (i // 100) % 4
+            axes = [128, 128, 128, 128]
+            axes[phase] = 128 + int(120 * ((i % 100) / 50.0 - 1.0))
+            recorder.record(inputDevice.Sample(i, i / 200.0, axes))
+        recorder.close()
+    source = inputDevice.TraceSource.load(path, speed, loop=False)
+    sc = RPIservo.ServoCtrl()
+    sc.moveInit()
+    sc.daemon = True
+    sc.start()
+    layers = {'': {axis: inputDevice.AxisMap(axis, 1) for axis in range(0, 4)}}
+    joystick = inputDevice.Joystick(sc, layers, source=source, report=None)
+    joystick.setup()
+    joystick.start()
+    threading.Thread(target=joystick.loop, daemon=True).start()
+    while not source.done:
+        time.sleep(0.05)
+    time.sleep(0.1)
+    results = [('handled', joystick.latency.stats())]
+    results += [('apply ' + name, stats) for name, stats in sc.commandStats().items() if name in ('Jog', 'Stop')]
+    results.append(('write', sc.latencyStats()))
+    print("%-10s %s, %d frames at x%.1f" % ("replay", os.path.basename(path), len(source.frames), speed))
+    for name, stats in results:
+        print("%-10s sample to %-10s %5d, p50 %.2f ms, p90 %.2f ms, p99 %.2f ms, max %.2f ms" % ("", name, stats['count'], stats['p50'] * 1000, stats['p90'] * 1000, stats['p99'] * 1000, stats['max'] * 1000))
+
+
+# 一次 jog 请求加一次关节状态回复: JSON 与二进制协议的编解码耗时和字节数。
+# One jog request plus one joint-state reply: encode/decode time and bytes, JSON versus the binary protocol.
+def benchProtocol(count=5000):
+    import json
+    import protocol
+    angles = [90, 45, 120, 90, 90]
+    request = protocol.JOG_FRAME.pack(protocol.JOG, 2, 1, 0.5)
+    textRequest = json.dumps('jog 2 1 0.5')
+
+    def text(i):
+        json.loads(textRequest).split()
+        return json.dumps({'status': 'ok', 'title': 'get_state', 'data': {'angles': angles, 'moving': True}})
+
+    def binary(i):
+        protocol.decode(request)
+        return protocol.jointState(angles, True)
+
+    report("protocol", timePerCall(text, count), timePerCall(binary, count))
+    print("%-10s %d + %d bytes per exchange before, %d + %d after" % ("", len(textRequest), len(text(0)), len(request), len(binary(0))))
+
+
+# 事件循环延迟: 阻塞 20ms 的操作 (模拟慢的总线传输或写文件) 直接在协程中执行与交给硬件线程的对比。
+# Event loop lag while 20 ms blocking calls (standing in for a slow bus transfer or file write)
+# run inline in the coroutine versus on the hardware thread.
+def benchEventLoop(calls=20, blocking=0.02):
+    import asyncio
+    import hardwareActor
+
+    async def inline():
+        time.sleep(blocking)
+
+    async def offloaded(actor):
+        await actor.call(time.sleep, blocking)
+
+    async def run(offload):
+        monitor = hardwareActor.LoopMonitor(interval=0.005)
+        monitor.start()
+        actor = hardwareActor.HardwareActor()
+        for i in range(0, calls):
+            await (offloaded(actor) if offload else inline())
+            await asyncio.sleep(0.005)
+        monitor.task.cancel()
+        return monitor.stats()
+
+    for name, offload in (('inline', False), ('actor', True)):
+        stats = asyncio.get_event_loop().run_until_complete(run(offload))
+        print("%-10s %-6s loop lag p50 %.2f ms, p99 %.2f ms, max %.2f ms" % ("eventloop", name, stats['p50'] * 1000, stats['p99'] * 1000, stats['max'] * 1000))
+
+
+# 网页每个指针事件发一个 jog: 500 个命令 (5 个舵机轮流) 以 200 条每秒到达, 每个命令执行 20ms。
+# 按顺序全部执行 (之前) 与 inboundQueue 合并加限速 (之后) 的执行数和最后一个命令的等待时间。
+# A page that sends a jog on every pointer event: 500 commands (5 servos in turn) arriving at
+# 200 per second, 20 ms each to run. Commands run and how long the last one waited, running
+# every command in order (before) versus coalescing and rate limiting with inboundQueue (after).
+def benchInbound(count=500, arrival=0.005, cost=0.02):
+    import asyncio
+    import inboundQueue
+
+    async def run(inbound):
+        done = []
+
+        async def consumer():
+            while True:
+                key, stamp = await inbound.get()
+                await asyncio.sleep(cost)
+                done.append(time.monotonic() - stamp)
+
+        task = asyncio.ensure_future(consumer())
+        for i in range(0, count):
+            if isinstance(inbound, asyncio.Queue):
+                await inbound.put((i % 5, time.monotonic()))
+            else:
+                await inbound.put((i % 5, time.monotonic()), ('joint', i % 5))
+            await asyncio.sleep(arrival)
+        while (inbound.qsize() if isinstance(inbound, asyncio.Queue) else inbound.items):
+            await asyncio.sleep(cost)
+        await asyncio.sleep(cost * 2)
+        task.cancel()
+        return done
+
+    for name, inbound in (('fifo', asyncio.Queue()), ('coalesce', inboundQueue.InboundQueue(rate=50.0, burst=20))):
+        done = asyncio.get_event_loop().run_until_complete(run(inbound))
+        extra = ''
+        if not isinstance(inbound, asyncio.Queue):
+            stats = inbound.stats()
+            extra = ', %d coalesced, max depth %d' % (stats['coalesced'], stats['maxDepth'])
+        print("%-10s %-8s %4d of %d commands run, last waited %6.1f ms%s" % ("inbound", name, len(done), count, done[-1] * 1000, extra))
+
+
+# 流式设定值: 客户端以 30Hz 发送正弦路径, 网络延迟为 10ms 加均值 20ms 的随机抖动, 5% 的帧因重传晚到 200ms。
+# 控制循环 100Hz。收到即使用最新的设定值 (之前) 与 setpointStream 缓冲插值 (之后) 的最大单步和不平滑度。
+# Streamed setpoints: the client sends a sine path at 30 Hz over a link with 10 ms latency plus
+# 20 ms mean random jitter, and 5% of the frames are 200 ms late (retransmitted). The control
+# loop ticks at 100 Hz. Largest step per tick and roughness (rms second difference, degrees)
+# when the newest setpoint is used on arrival (before) versus the setpointStream jitter buffer (after).
+def benchStream(seconds=5.0, rate=30, tickRate=100, seed=1):
+    import math
+    import random
+    import setpointStream
+    random.seed(seed)
+    packets = []
+    arrival = 0.0
+    for i in range(0, int(seconds * rate)):
+        t = i / float(rate)
+        delay = 0.01 + random.expovariate(1 / 0.02) + (0.2 if random.random() < 0.05 else 0.0)
+        arrival = max(arrival, t + delay) # 同一连接内按顺序到达 / in order on one connection
+        packets.append((arrival, t, [90 + 40 * math.sin(2 * t)]))
+
+    def roughness(angles):
+        steps = [angles[i + 1] - angles[i] for i in range(0, len(angles) - 1)]
+        accel = [steps[i + 1] - steps[i] for i in range(0, len(steps) - 1)]
+        return max(abs(step) for step in steps), math.sqrt(sum(a * a for a in accel) / len(accel))
+
+    results = {}
+    for name in ('arrival', 'buffer'):
+        buffer = setpointStream.JitterBuffer()
+        angle = 90.0
+        angles = []
+        n = 0
+        for tick in range(0, int((seconds + 0.5) * tickRate)):
+            now = tick / float(tickRate)
+            while n < len(packets) and packets[n][0] <= now:
+                if name == 'arrival':
+                    angle = packets[n][2][0]
+                else:
+                    buffer.push(packets[n][1], packets[n][2], packets[n][0])
+                n += 1
+            if name == 'buffer':
+                sample = buffer.sample(now)
+                if sample is not None:
+                    angle = sample[0]
+            angles.append(angle)
+        results[name] = roughness(angles[tickRate // 2:])
+        if name == 'buffer':
+            stats = buffer.stats()
+    print("%-10s max step before: %5.2f deg   after: %5.2f deg" % ("stream", results['arrival'][0], results['buffer'][0]))
+    print("%-10s roughness before: %5.2f deg   after: %5.2f deg, %d late, %d underrun ticks" % ("", results['arrival'][1], results['buffer'][1], stats['late'], stats['underruns']))
+
+
+# 网页服务: Flask 开发服务器 (app.py) 与 asyncio 服务器 (staticServer.py) 的每秒请求数和内存。
+# 两个服务器各在一个子进程中运行, 用 concurrency 个并发连接请求首页和一个 js 文件。
+# Web page serving: requests per second and memory of the Flask development server (app.py)
+# versus the asyncio server (staticServer.py). Each server runs in a child process and is
+# loaded with `concurrency` parallel connections fetching the index page and a js file.
+def benchHTTP(requests=400, concurrency=8):
+    import asyncio
+    import subprocess
+    import psutil
+    here = os.path.dirname(os.path.realpath(__file__))
+    script = sorted(os.listdir(os.path.join(here, 'dist', 'js')))[0]
+    paths = ['/', '/js/' + script]
+    servers = (
+        ('flask', 5077, [sys.executable, '-c', "import app; app.app.run(host='127.0.0.1', port=5077, threaded=True)"]),
+        ('asyncio', 5078, [sys.executable, 'staticServer.py', '5078']),
+    )
+
+    async def fetch(port, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(('GET %s HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: gzip\r\nConnection: close\r\n\r\n' % path).encode())
+        data = await reader.read()
+        writer.close()
+        if not data.startswith(b'HTTP/1.1 200'):
+            raise RuntimeError("%s: %s" % (path, data[:40]))
+        return len(data)
+
+    async def load(port):
+        async def worker(n):
+            size = 0
+            for i in range(0, n):
+                size += await fetch(port, paths[i % len(paths)])
+            return size
+        return sum(await asyncio.gather(*[worker(requests // concurrency) for i in range(0, concurrency)]))
+
+    for name, port, command in servers:
+        process = subprocess.Popen(command, cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for i in range(0, 100): # 等待服务器启动 / wait for the server to listen
+                try:
+                    asyncio.get_event_loop().run_until_complete(fetch(port, '/'))
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            start = time.perf_counter()
+            size = asyncio.get_event_loop().run_until_complete(load(port))
+            elapsed = time.perf_counter() - start
+            rss = psutil.Process(process.pid).memory_info().rss
+            print("%-10s %-8s %7.0f requests/s, %5.1f MB RSS, %6.1f kB per request" % ("http", name, requests / elapsed, rss / 1e6, size / 1e3 / requests))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+benchmarks = {
+    'servo': benchServo,
+    'frame': benchFrame,
+    'coalesce': benchCoalesce,
+    'loop': benchLoop,
+    'trajectory': benchTrajectory,
+    'plan': benchPlan,
+    'commands': benchCommands,
+    'adc': benchADC,
+    'input': benchInput,
+    'replay': benchReplay,
+    'protocol': benchProtocol,
+    'eventloop': benchEventLoop,
+    'http': benchHTTP,
+    'inbound': benchInbound,
+    'stream': benchStream,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+# File name   : commandRegistry.py
+# Description : Table-driven dispatch of web interface commands.
+#               A command is "name arg1 arg2 ...". The name is looked up in a dict, and
+#               the handler is called with the response and the arguments converted to
+#               the types it was registered with. Old fixed strings such as "C_add" are
+#               aliases that expand to a parameterized command ("jog 2 1 1").
+#               run() takes the name and arguments directly, for the binary protocol.
+#               batch() runs a list of text commands in one call: all of them are checked
+#               first, so a bad command means none run, then they run in order until one fails.
+#               Time spent in every handler is recorded per command.
+import time
+from servoCommands import LatencyStats
+
+
+# 一个已注册的命令: 处理函数, 参数类型, 必需参数个数。
+# A registered command: the handler, the argument types and how many arguments are required.
+class Command:
+    def __init__(self, name, handler, types=(), required=None):
+        self.name = name
+        self.handler = handler
+        self.types = tuple(types)
+        self.required = len(self.types) if required is None else required
+        self.timing = LatencyStats()
+
+    def parse(self, args):
+        if not self.required <= len(args) <= len(self.types):
+            if self.required == len(self.types):
+                raise ValueError("%s takes %d arguments, got %d" % (self.name, self.required, len(args)))
+            raise ValueError("%s takes %d to %d arguments, got %d" % (self.name, self.required, len(self.types), len(args)))
+        return [self.types[i](args[i]) for i in range(0, len(args))]
+
+
+class CommandRegistry:
+    def __init__(self):
+        self.commands = {}
+        self.aliases = {} # 旧命令名: (命令名, 参数) / legacy name: (command name, arguments)
+        self.unknown = 0
+        self.maxBatch = 64 # 一个批量中最多的命令数 / most commands in one batch
+
+    def register(self, name, handler, types=(), required=None):
+        self.commands[name] = Command(name, handler, types, required)
+
+    # 装饰器形式的 register / register() as a decorator.
+    def command(self, name, types=(), required=None):
+        def decorator(handler):
+            self.register(name, handler, types, required)
+            return handler
+        return decorator
+
+    def alias(self, name, command, *args):
+        self.aliases[name] = (command, [str(arg) for arg in args])
+
+    # 执行一条文本命令, 未知命令返回 False, 参数错误时在 response 中返回错误。
+    # Run one text command. Returns False for an unknown command; bad arguments are reported in the response.
+    def dispatch(self, message, response):
+        words = message.split()
+        if not words:
+            return False
+        return self.run(words[0], words[1:], response)
+
+    # 展开旧命令名, 返回 (命令名, 参数) / Expand a legacy name; returns (command name, arguments).
+    def resolve(self, name, args):
+        if name in self.aliases:
+            command, prefix = self.aliases[name]
+            return command, prefix + list(args)
+        return name, args
+
+    # 按名称执行命令, args 为已拆分的参数 (如二进制协议解码后的数值)。
+    # Run a command by name with already split arguments (e.g. values decoded from the binary protocol).
+    def run(self, name, args, response):
+        name, args = self.resolve(name, args)
+        command = self.commands.get(name)
+        if command is None:
+            self.unknown += 1
+            return False
+        start = time.perf_counter()
+        try:
+            command.handler(response, *command.parse(args))
+        except ValueError as e:
+            response['status'] = 'error'
+            response['title'] = name
+            response['data'] = str(e)
+        command.timing.record(time.perf_counter() - start)
+        return True
+
+    # 依次执行多条文本命令, 回复为每条命令的 response 列表。先检查全部命令, 有未知命令或参数错误时
+    # 一条都不执行; 执行中某条命令出错时停止, 回复到出错的命令为止。
+    # Run several text commands in order; the reply data is the list of their responses. Every
+    # command is checked first, and an unknown command or bad arguments means none of them run.
+    # A command that fails while running stops the batch, and the reply ends with its response.
+    def batch(self, messages, response):
+        response['title'] = 'batch'
+        calls = []
+        try:
+            if len(messages) > self.maxBatch:
+                raise ValueError("batch of %d commands, at most %d" % (len(messages), self.maxBatch))
+            for i in range(0, len(messages)):
+                words = messages[i].split() if isinstance(messages[i], str) else []
+                if not words:
+                    raise ValueError("command %d: not a command: %r" % (i, messages[i]))
+                name, args = self.resolve(words[0], words[1:])
+                if name not in self.commands:
+                    self.unknown += 1
+                    raise ValueError("command %d: unknown command %r" % (i, words[0]))
+                try:
+                    self.commands[name].parse(args)
+                except ValueError as e:
+                    raise ValueError("command %d: %s" % (i, e))
+                calls.append((name, args))
+        except ValueError as e:
+            response['status'] = 'error'
+            response['data'] = str(e)
+            return
+        results = []
+        for name, args in calls:
+            result = {
+                'status': 'ok',
+                'title': '',
+                'data': None
+            }
+            self.run(name, args, result)
+            results.append(result)
+            if result['status'] != 'ok':
+                response['status'] = 'error'
+                break
+        response['data'] = results
+
+    # 每个命令的调用次数与耗时, total 为累计耗时 (秒)。
+    # Calls and handler time per command; total is the accumulated time (s).
+    def stats(self):
+        result = {}
+        for name, command in self.commands.items():
+            if command.timing.count:
+                stats = command.timing.stats()
+                stats['total'] = command.timing.total
+                result[name] = stats
+        return result
@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+# File name   : hardware.py
+# Description : Hardware backend selection.
+#               ROBOT_HW=pi (default) uses the real I2C bus and GPIO of the Raspberry Pi.
+#               ROBOT_HW=sim uses the simulated PCA9685, PCF8591 and GPIO buttons below,
+#               so the server and the plan engine run on a plain Linux machine.
+#               ROBOT_SIM_SCRIPT=<file.json> replays scripted joystick input in sim mode:
+#               [[time, [a0, a1, a2, a3], [pressed pins]], ...]
+#               ROBOT_SIM_REALTIME=1 makes simulated bus transfers take their modelled time.
+import os
+import time
+import json
+import threading
+
+BACKEND = os.environ.get('ROBOT_HW', 'pi')
+SIM_REALTIME = os.environ.get('ROBOT_SIM_REALTIME', '0') == '1'
+I2C_CLOCK = 100000 # Hz
+
+# I2C 传输时间: 起始位、地址和数据, 每字节 9 位。
+# Modelled I2C transfer time: start, address and data bytes, 9 bits each.
+def busTime(nbytes):
+    return (nbytes + 1) * 9.0 / I2C_CLOCK
+
+
+# 模拟的 I2C 总线统计 / Statistics of a simulated I2C bus.
+class SimBus:
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.busTime = 0.0
+
+    def transfer(self, nbytes):
+        t = busTime(nbytes)
+        self.transactions += 1
+        self.bytes += nbytes
+        self.busTime += t
+        if SIM_REALTIME:
+            time.sleep(t)
+
+    def stats(self):
+        return {'transactions': self.transactions, 'bytes': self.bytes, 'busTime': self.busTime}
+
+
+class SimI2CDevice:
+    def __init__(self, chip):
+        self.chip = chip
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def write(self, buf):
+        self.chip.write(bytes(buf))
+
+
+class SimPWMChannel:
+    def __init__(self, chip, index):
+        self.chip = chip
+        self.index = index
+
+    @property
+    def frequency(self):
+        return self.chip.frequency
+
+    @property
+    def duty_cycle(self):
+        on, off = self.chip.pwm(self.index)
+        if on == 0x1000:
+            return 0xFFFF
+        if off == 0x1000:
+            return 0
+        return off << 4
+
+    # 与 adafruit_pca9685 相同的寄存器写入 / Same register write as adafruit_pca9685.
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError("Out of range")
+        if value == 0xFFFF:
+            on, off = 0x1000, 0
+        elif value < 0x0010:
+            on, off = 0, 0x1000
+        else:
+            on, off = 0, value >> 4
+        self.chip.write(bytes([0x06 + 4 * self.index, on & 0xFF, on >> 8, off & 0xFF, off >> 8]))
+
+
+# 模拟的 PCA9685: 记录寄存器写入并按总线速率计时。
+# Simulated PCA9685: models the register file and the bus time of every write.
+class SimPCA9685:
+    def __init__(self, address=0x40, reference_clock_speed=25000000):
+        self.address = address
+        self.reference_clock_speed = reference_clock_speed
+        self.registers = bytearray(256)
+        self.registers[0xFE] = 0x1E # 上电默认 200Hz / power-on default 200 Hz
+        self.bus = SimBus()
+        self.lastWrite = 0.0
+        self.i2c_device = SimI2CDevice(self)
+        self.channels = [SimPWMChannel(self, i) for i in range(0, 16)]
+
+    # 寄存器地址后跟数据, MODE1 的 AI 位打开时地址自增。
+    # Register address followed by data; the address auto-increments when MODE1.AI is set.
+    def write(self, buf):
+        self.bus.transfer(len(buf))
+        reg = buf[0]
+        for i in range(1, len(buf)):
+            self.registers[reg] = buf[i]
+            if self.registers[0x00] & 0x20:
+                reg = (reg + 1) & 0xFF
+        self.lastWrite = time.monotonic()
+
+    def pwm(self, index):
+        base = 0x06 + 4 * index
+        r = self.registers
+        return (r[base] | r[base + 1] << 8, r[base + 2] | r[base + 3] << 8)
+
+    @property
+    def frequency(self):
+        self.bus.transfer(2)
+        return self.reference_clock_speed / 4096 / (self.registers[0xFE] + 1)
+
+    @frequency.setter
+    def frequency(self, freq):
+        prescale = int(self.reference_clock_speed / 4096.0 / freq + 0.5) - 1
+        if prescale < 3:
+            raise ValueError("PCA9685 cannot output at the given frequency")
+        old_mode = self.registers[0x00]
+        self.write(bytes([0x00, (old_mode & 0x7F) | 0x10]))
+        self.write(bytes([0xFE, prescale]))
+        self.write(bytes([0x00, old_mode]))
+        self.write(bytes([0x00, old_mode | 0xA0]))
+
+    def deinit(self):
+        self.write(bytes([0x00, 0x00]))
+
+
+# 脚本化的摇杆输入, 没有脚本时摇杆居中、按键松开。
+# Scripted joystick input. Without a script the sticks rest at the centre and no button is pressed.
+class SimInputScript:
+    def __init__(self, path=None):
+        self.frames = []
+        if path:
+            with open(path, 'r') as f:
+                for frame in json.load(f):
+                    pressed = frame[2] if len(frame) > 2 else []
+                    self.frames.append((float(frame[0]), list(frame[1]), set(pressed)))
+        self.axes = [128, 128, 128, 128]
+        self.pressed = set()
+        self.start = time.monotonic()
+
+    # 当前时刻的一帧, 脚本循环播放 / The frame at the current time; the script loops.
+    def frame(self):
+        if not self.frames:
+            return self.axes, self.pressed
+        t = (time.monotonic() - self.start) % (self.frames[-1][0] or 1.0)
+        current = self.frames[0]
+        for frame in self.frames:
+            if frame[0] > t:
+                break
+            current = frame
+        return current[1], current[2]
+
+    def set(self, chn, value):
+        self.frames = []
+        self.axes[chn] = int(value)
+
+    def press(self, pin):
+        self.frames = []
+        self.pressed.add(pin)
+
+    def release(self, pin):
+        self.frames = []
+        self.pressed.discard(pin)
+
+
+# 模拟的 PCF8591, 提供 smbus.SMBus 的接口。
+# Simulated PCF8591 behind the smbus.SMBus interface.
+class SimSMBus:
+    def __init__(self, script):
+        self.script = script
+        self.bus = SimBus()
+        self.control = 0x40
+        self.latch = 0x80 # 上一次转换的结果 / result of the previous conversion
+        self.dac = 0
+
+    def write_byte(self, address, value):
+        self.bus.transfer(1)
+        self.control = value
+
+    # 每次读取返回上一次转换结果并开始新的转换, 与芯片一致。
+    # Each read returns the previous conversion and starts a new one, as the chip does.
+    def read_byte(self, address):
+        self.bus.transfer(1)
+        value = self.latch
+        self.latch = self.script.frame()[0][self.control & 0x03]
+        if self.control & 0x04:
+            self.control = (self.control & ~0x03) | ((self.control + 1) & 0x03)
+        return value
+
+    # 写入控制字节后连续读取 (一次传输) / Write the control byte, then read a block (one transaction).
+    def read_i2c_block_data(self, address, register, length):
+        self.bus.transfer(length + 2)
+        self.control = register
+        values = self.script.frame()[0]
+        data = [self.latch]
+        for i in range(1, length):
+            data.append(values[self.control & 0x03])
+            if self.control & 0x04:
+                self.control = (self.control & ~0x03) | ((self.control + 1) & 0x03)
+        self.latch = data[-1]
+        return data
+
+    def write_byte_data(self, address, register, value):
+        self.bus.transfer(2)
+        self.control = register
+        self.dac = value
+
+
+# 模拟的 RPi.GPIO, 按键上拉, 按下为低电平。
+# 边沿检测由一个线程每毫秒检查一次电平来模拟, press()/release() 立即触发回调。
+# Simulated RPi.GPIO. Buttons are pulled up and read low while pressed.
+# Edge detection is modelled by a thread that checks the levels every millisecond;
+# press()/release() fire the callbacks at once.
+class SimGPIO:
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, script):
+        self.script = script
+        self.mode = None
+        self.pins = {}
+        self.events = {} # pin: [edge, bouncetime (秒/s), 回调/callbacks, 电平/level, 上次触发/last edge]
+        self.lock = threading.Lock()
+        self.watcher = None
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=LOW):
+        self.pins[pin] = initial if direction == self.OUT else (1 if pull_up_down == self.PUD_UP else 0)
+
+    def input(self, pin):
+        if pin in self.script.frame()[1]:
+            return self.LOW
+        return self.pins.get(pin, self.HIGH)
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self.events:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        with self.lock:
+            self.events[pin] = [edge, (bouncetime or 0) / 1000.0, [], self.input(pin), None]
+        if callback is not None:
+            self.add_event_callback(pin, callback)
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=self.watch, daemon=True)
+            self.watcher.start()
+
+    def add_event_callback(self, pin, callback):
+        self.events[pin][2].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.events.pop(pin, None)
+
+    # 检查所有开启边沿检测的引脚, 在调用者的线程里执行回调。
+    # Check every pin with edge detection and run the callbacks on the caller's thread.
+    def poll(self):
+        fired = []
+        with self.lock:
+            now = time.monotonic()
+            for pin, event in self.events.items():
+                level = self.input(pin)
+                if level == event[3]:
+                    continue
+                event[3] = level
+                if event[0] == self.RISING and level == self.LOW or event[0] == self.FALLING and level == self.HIGH:
+                    continue
+                if event[4] is not None and now - event[4] < event[1]:
+                    continue
+                event[4] = now
+                fired.extend((callback, pin) for callback in event[2])
+        for callback, pin in fired:
+            callback(pin)
+
+    def watch(self):
+        while True:
+            self.poll()
+            time.sleep(0.001)
+
+    def press(self, pin):
+        self.script.press(pin)
+        self.poll()
+
+    def release(self, pin):
+        self.script.release(pin)
+        self.poll()
+
+    def cleanup(self):
+        self.pins = {}
+        self.events = {}
+
+
+if BACKEND == 'sim':
+    simScript = SimInputScript(os.environ.get('ROBOT_SIM_SCRIPT'))
+    simSMBus = SimSMBus(simScript)
+    GPIO = SimGPIO(simScript)
+else:
+    import RPi.GPIO as GPIO
+
+
+# 打开 PCA9685 舵机驱动芯片 / Open the PCA9685 servo driver.
+def openPCA9685(address=0x40):
+    if BACKEND == 'sim':
+        return SimPCA9685(address)
+    from adafruit_pca9685 import PCA9685
+    import busio
+    from board import SCL, SDA
+    return PCA9685(busio.I2C(SCL, SDA), address=address)
+
+# 打开 I2C 总线 (PCF8591) / Open the I2C bus (PCF8591).
+def openSMBus(bus):
+    if BACKEND == 'sim':
+        return simSMBus
+    import smbus
+    return smbus.SMBus(bus)
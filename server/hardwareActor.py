@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# File name   : hardwareActor.py
+# Description : Keeps blocking work off the asyncio event loop.
+#               HardwareActor runs functions on one dedicated worker thread, so I2C
+#               writes and file I/O from websocket commands run one at a time and in
+#               order, and the coroutine awaits the result. LoopMonitor measures how late
+#               the event loop wakes up (its lag), which shows whether it stays responsive.
+import time
+import asyncio
+import concurrent.futures
+from servoCommands import LatencyStats
+
+
+class HardwareActor:
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='hardware')
+        self.pending = 0
+        self.maxPending = 0
+        self.callTime = LatencyStats() # 排队加执行的时间 / queueing plus running time
+
+    # 在硬件线程中执行 func(*args) 并等待结果 / Run func(*args) on the hardware thread and await the result.
+    async def call(self, func, *args):
+        start = time.monotonic()
+        self.pending += 1
+        self.maxPending = max(self.maxPending, self.pending)
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.callTime.record(time.monotonic() - start)
+
+    def stats(self):
+        return {'pending': self.pending, 'maxPending': self.maxPending, 'callTime': self.callTime.stats()}
+
+
+# 每 interval 秒醒来一次, 记录比预定时间晚了多少。
+# Wakes up every `interval` seconds and records how late it was.
+class LoopMonitor:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.lag = LatencyStats()
+        self.task = None
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(0.0, time.monotonic() - start - self.interval))
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stats(self):
+        return self.lag.stats()
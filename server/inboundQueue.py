@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# File name   : inboundQueue.py
+# Description : Per-connection inbound stage of the control websocket.
+#               The reader task puts every received command in an InboundQueue and one
+#               worker task takes them out, in order, through a token bucket (at most
+#               `rate` commands per second, `burst` at once). A command with a key (the
+#               joint it moves) replaces the command with the same key that is still
+#               waiting: the latest one wins and the older one is neither run nor answered.
+#               Commands without a key are never coalesced, and a batch takes one token
+#               per command it holds. When `maxsize` commands are waiting, put() waits for
+#               room, so the reader stops reading and the client is slowed down by the
+#               socket instead of the queue growing.
+import time
+import asyncio
+import itertools
+import collections
+from servoCommands import LatencyStats
+
+
+# 令牌桶: 每秒补充 rate 个令牌, 最多存 burst 个。
+# Token bucket: refilled with `rate` tokens per second, holding at most `burst`.
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    # 取 n 个令牌, 返回需要等待的秒数 (0 为不用等)。
+    # Take n tokens; returns the seconds to wait until they are due (0 when they are available).
+    def take(self, n=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= n
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    # 退还 take() 取走的令牌 / Give back tokens taken with take().
+    def refund(self, n=1):
+        self.tokens += n
+
+
+# 计数和排队时间, 每个连接一份, webServer 另有一份所有连接的合计。
+# Counters and queueing time; one per connection, plus the total of all connections in webServer.
+class InboundStats:
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.queueTime = LatencyStats() # 从收到到开始执行 / from receiving to running
+
+    def stats(self):
+        result = {name: self.counts[name] for name in ('received', 'processed', 'coalesced', 'dropped', 'limited', 'blocked')}
+        result['queueTime'] = self.queueTime.stats()
+        return result
+
+
+class InboundQueue:
+    def __init__(self, rate=50.0, burst=20, maxsize=32, totals=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict() # 键: (命令, 收到的时间, 令牌数) / key: (command, time received, tokens)
+        self.serial = itertools.count() # 没有键的命令使用的唯一键 / unique keys for commands without one
+        self.ready = asyncio.Event()
+        self.room = asyncio.Event()
+        self.maxDepth = 0
+        self.inbound = InboundStats()
+        self.totals = totals
+
+    def count(self, name, n=1):
+        self.inbound.counts[name] += n
+        if self.totals is not None:
+            self.totals.counts[name] += n
+
+    # 放入一个命令。key 相同或在 supersedes 中的等待中命令被替换; 队列满时等待。cost 为需要的令牌数。
+    # Queue a command. A waiting command with the same key, or one listed in `supersedes`, is
+    # replaced by it; when the queue is full this waits for room. cost is the tokens it takes.
+    async def put(self, item, key=None, supersedes=(), cost=1):
+        self.count('received')
+        replaced = [other for other in (key,) + tuple(supersedes) if other is not None and other in self.items]
+        for other in replaced:
+            del self.items[other]
+        self.count('coalesced', len(replaced))
+        if not replaced:
+            if len(self.items) >= self.maxsize:
+                self.count('blocked')
+            while len(self.items) >= self.maxsize:
+                self.room.clear()
+                await self.room.wait()
+        if key is None:
+            key = next(self.serial)
+        self.items[key] = (item, time.monotonic(), cost)
+        self.maxDepth = max(self.maxDepth, len(self.items))
+        self.ready.set()
+
+    # 按顺序取出下一个命令, 令牌不足时等待。等待期间到达的新命令仍然可以替换它, 这时退还
+    # 令牌, 按新命令的令牌数重新计算。
+    # Take the next command in order, waiting for its tokens first. A newer command that arrives
+    # during the wait still replaces it; the tokens are then given back and the new head is
+    # charged instead.
+    async def get(self):
+        while True:
+            while not self.items:
+                self.ready.clear()
+                await self.ready.wait()
+            key, entry = next(iter(self.items.items()))
+            delay = self.bucket.take(entry[2])
+            if delay > 0:
+                self.count('limited')
+                await asyncio.sleep(delay)
+            if self.items and next(iter(self.items.values())) is entry:
+                break
+            self.bucket.refund(entry[2])
+        key, (item, stamp, cost) = self.items.popitem(last=False)
+        self.room.set()
+        self.count('processed')
+        self.inbound.queueTime.record(time.monotonic() - stamp)
+        if self.totals is not None:
+            self.totals.queueTime.record(time.monotonic() - stamp)
+        return item
+
+    # 连接关闭: 丢弃还在等待的命令 / The connection closed: drop the waiting commands.
+    def close(self):
+        self.count('dropped', len(self.items))
+        self.items.clear()
+
+    def stats(self):
+        result = self.inbound.stats()
+        result['depth'] = len(self.items)
+        result['maxDepth'] = self.maxDepth
+        return result
@@ -4,12 +4,15 @@
 # Website     : www.gewbot.com
 # Author      : William
 # Date        : 2019/08/28
+import os
 import psutil
 
 def get_cpu_tempfunc():
     """ Return CPU temperature """
     result = 0
     mypath = "/sys/class/thermal/thermal_zone0/temp"
+    if not os.path.exists(mypath):  # no thermal zone, e.g. simulated hardware
+        return str(0.0)
     with open(mypath, 'r') as mytmpfile:
         for line in mytmpfile:
             result = line
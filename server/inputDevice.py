@@ -0,0 +1,447 @@
+#!/usr/bin/python3
+# File name   : inputDevice.py
+# Description : Joystick input layer shared by every front end.
+#               A source (PCF8591 joystick, replayed trace or network) is read by a sampler
+#               thread at a fixed rate; consumers read the newest sample without blocking
+#               or locking. A Joystick maps axes to joints through a declarative table
+#               and posts jog commands to a target with the ServoCtrl interface
+#               (singleServo/stopWiggle). Buttons are handled by edge-detect callbacks.
+#               TraceRecorder saves the samples to a compact binary trace that TraceSource
+#               replays at real or accelerated speed.
+import time
+import json
+import struct
+import atexit
+import traceback
+import threading
+import collections
+import PCF8591 as ADC
+from hardware import GPIO
+from servoCommands import LatencyStats
+
+# seq: 序号, stamp: time.monotonic() 采样时间, axes: 4 个 ADC 通道
+# seq: sequence number, stamp: time.monotonic() of the sample, axes: the four ADC channels
+Sample = collections.namedtuple('Sample', ['seq', 'stamp', 'axes'])
+
+# 一个轴控制的关节: joint 舵机号, sign 为 +1 时摇杆正向 (数值变大) 使舵机正转,
+# labels 为 (负向, 正向) 时打印的状态。
+# The joint an axis drives: joint is the servo ID, sign +1 turns the servo forward when the
+# axis value rises; labels are the states printed for (negative, positive) deflection.
+AxisMap = collections.namedtuple('AxisMap', ['joint', 'sign', 'labels'], defaults=[('', '')])
+
+
+# 摇杆模块上的 PCF8591 / The PCF8591 on the joystick module.
+class PCF8591Source:
+    def __init__(self, address=0x48):
+        self.address = address
+
+    def setup(self):
+        ADC.setup(self.address)
+
+    def read(self):
+        return ADC.scan()
+
+
+# 二进制记录文件: 文件头为标识和最多 4 个按键引脚 (0 为未用), 每个样本 13 字节:
+# 距第一个样本的微秒数 (64 位), 4 个 ADC 通道, 按键位图 (第 i 位为 1 表示第 i 个引脚按下)。
+# 第一版 (ADRTRACE) 的时间为 32 位, 记录 71 分钟后溢出, 仍可回放。
+# Binary trace file: the header is the magic and up to 4 button pins (0 when unused); each
+# sample is 13 bytes: microseconds since the first sample (64 bits), the four ADC channels,
+# and a button bitmap (bit i set while the i-th pin is pressed). The first version
+# (ADRTRACE) stored 32-bit times, which overflow after 71 minutes; it can still be replayed.
+TRACE_MAGIC = b'ADRTRAC2'
+TRACE_HEADER = struct.Struct('<8s4B')
+TRACE_RECORD = struct.Struct('<Q4BB')
+TRACE_RECORDS = {b'ADRTRACE': struct.Struct('<I4BB'), TRACE_MAGIC: TRACE_RECORD} # 标识: 样本格式 / magic: record format
+
+
+# 把采样线程的每个样本写入记录文件, 按键电平在记录时读取。每 flushInterval 秒写到磁盘一次,
+# 进程被 SIGTERM 结束 (不执行 atexit) 时最多丢失这段时间的记录。
+# Writes every sample of the sampler thread to a trace file; button levels are read when recording.
+# The file is flushed every flushInterval seconds, so a process ended by SIGTERM (which skips
+# atexit) loses at most that much of the trace.
+class TraceRecorder:
+    def __init__(self, path, pins=(), flushInterval=1.0):
+        self.pins = tuple(pins)[:4]
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, *(self.pins + (0,) * (4 - len(self.pins)))))
+        self.start = None
+        self.count = 0
+        self.flushInterval = flushInterval
+        self.flushed = time.monotonic()
+        atexit.register(self.close)
+
+    def record(self, sample):
+        if self.file is None:
+            return
+        if self.start is None:
+            self.start = sample.stamp
+        buttons = 0
+        for i in range(0, len(self.pins)):
+            if GPIO.input(self.pins[i]) == 0:
+                buttons |= 1 << i
+        self.file.write(TRACE_RECORD.pack(int((sample.stamp - self.start) * 1e6), *sample.axes[:4], buttons))
+        self.count += 1
+        now = time.monotonic()
+        if now - self.flushed >= self.flushInterval:
+            self.file.flush()
+            self.flushed = now
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# 回放记录的摇杆输入, frames 为 [(时间, [a0, a1, a2, a3], {按下的引脚}), ...]。
+# speed 大于 1 时加速回放; loop 为 False 时播放一遍后停在最后一帧 (done 为 True)。
+# 在模拟模式下按键变化通过 GPIO.press()/release() 重放, 触发与真实按键相同的回调。
+# Replays recorded joystick input; frames are [(time, [a0, a1, a2, a3], {pressed pins}), ...].
+# A speed above 1 replays faster; with loop False the replay stops on the last frame (done
+# becomes True). In sim mode button changes are replayed through GPIO.press()/release(),
+# which fire the same callbacks as real buttons.
+class TraceSource:
+    def __init__(self, frames, speed=1.0, loop=True):
+        self.frames = [(float(frame[0]), tuple(frame[1]), frozenset(frame[2] if len(frame) > 2 else ())) for frame in frames]
+        self.speed = speed
+        self.loop = loop
+        self.index = 0
+        self.start = None
+        self.pressed = frozenset()
+        self.done = False
+
+    @classmethod
+    def fromJson(cls, path, speed=1.0, loop=True):
+        with open(path, 'r') as f:
+            frames = json.load(f)
+        if not frames:
+            raise ValueError("Empty joystick trace: %s" % path)
+        return cls(frames, speed, loop)
+
+    @classmethod
+    def fromTrace(cls, path, speed=1.0, loop=True):
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = TRACE_HEADER.unpack_from(data)
+        if header[0] not in TRACE_RECORDS:
+            raise ValueError("Not a joystick trace: %s" % path)
+        pins = header[1:]
+        recordFormat = TRACE_RECORDS[header[0]]
+        frames = []
+        for offset in range(TRACE_HEADER.size, len(data) - recordFormat.size + 1, recordFormat.size):
+            record = recordFormat.unpack_from(data, offset)
+            pressed = [pins[i] for i in range(0, 4) if record[5] & (1 << i)]
+            frames.append((record[0] / 1e6, record[1:5], pressed))
+        if not frames: # 如第一次写入磁盘前被结束的记录 / e.g. a recording ended before its first flush
+            raise ValueError("Empty joystick trace: %s" % path)
+        return cls(frames, speed, loop)
+
+    # 按文件头识别二进制记录或 JSON / Binary trace or JSON, told apart by the header.
+    @classmethod
+    def load(cls, path, speed=1.0, loop=True):
+        with open(path, 'rb') as f:
+            binary = f.read(len(TRACE_MAGIC)) in TRACE_RECORDS
+        if binary:
+            return cls.fromTrace(path, speed, loop)
+        return cls.fromJson(path, speed, loop)
+
+    def setup(self):
+        self.start = time.monotonic()
+        self.index = 0
+        self.done = False
+
+    def read(self):
+        if self.start is None:
+            self.setup()
+        t = (time.monotonic() - self.start) * self.speed
+        length = self.frames[-1][0]
+        if self.loop and length > 0 and t >= length:
+            self.start += length * (t // length) / self.speed
+            t -= length * (t // length)
+            self.index = 0
+        while self.index + 1 < len(self.frames) and self.frames[self.index + 1][0] <= t:
+            self.index += 1
+        self.done = not self.loop and self.index + 1 == len(self.frames)
+        frame = self.frames[self.index]
+        if frame[2] != self.pressed and hasattr(GPIO, 'press'):
+            for pin in self.pressed - frame[2]:
+                GPIO.release(pin)
+            for pin in frame[2] - self.pressed:
+                GPIO.press(pin)
+        self.pressed = frame[2]
+        return frame[1]
+
+
+# 由网络客户端提供的摇杆数值, push() 整体替换 (赋值是原子的)。
+# Joystick values supplied by a network client; push() replaces them whole (the assignment is atomic).
+class NetworkSource:
+    def __init__(self):
+        self.axes = (128, 128, 128, 128)
+        self.pushed = 0
+
+    def setup(self):
+        pass
+
+    def push(self, axes):
+        self.axes = tuple(min(max(int(value), 0), 255) for value in axes[:4])
+        self.pushed += 1
+
+    def read(self):
+        return self.axes
+
+
+# 按名称打开输入源: 'adc' (默认), 'network', 或记录文件的路径 (speed 为回放速度)。
+# Open a source by name: 'adc' (default), 'network', or the path of a recorded trace
+# (replayed at `speed`).
+def openSource(spec='adc', speed=1.0):
+    if spec in (None, '', 'adc'):
+        return PCF8591Source()
+    if spec == 'network':
+        return NetworkSource()
+    return TraceSource.load(spec, speed)
+
+
+# 采样线程。latest 是单槽缓冲区, 每次采样整体替换 (赋值是原子的), history 是最近样本的环形缓冲区。
+# 采样或记录出错时打印错误并调用 onError (例如停止摇杆正在转动的舵机), 线程继续运行;
+# 记录出错后停止记录。
+# Sampler thread. `latest` is a single-slot buffer that is replaced whole on every sample
+# (the assignment is atomic), `history` is a ring buffer of the most recent samples.
+# An error reading or recording a sample is printed and onError is called (e.g. to stop the
+# joints a joystick is moving), and the thread keeps running; recording stops after an error.
+class InputSampler(threading.Thread):
+    def __init__(self, rate=200, source=None, history=256, onError=None):
+        super().__init__()
+        self.daemon = True
+        self.rate = rate # 采样频率 (Hz) / sampling rate (Hz)
+        self.source = source if source is not None else PCF8591Source()
+        self.recorder = None # TraceRecorder, 不为 None 时记录每个样本 / records every sample when set
+        self.latest = None
+        self.history = collections.deque(maxlen=history)
+        self.seq = 0
+        self.sampleTime = LatencyStats() # 每次采样的耗时 / time spent reading one sample
+        self.onError = onError
+        self.errors = 0
+        self.failing = False # 上一次采样出错, 连续的错误只打印一次 / the last sample failed; a run of errors is printed once
+
+    def sample(self):
+        start = time.monotonic()
+        axes = self.source.read()
+        self.seq += 1
+        sample = Sample(self.seq, time.monotonic(), axes)
+        self.history.append(sample)
+        self.latest = sample
+        if self.recorder is not None:
+            try:
+                self.recorder.record(sample)
+            except Exception:
+                self.recorder = None
+                raise
+        self.sampleTime.record(sample.stamp - start)
+        return sample
+
+    def run(self):
+        deadline = time.monotonic()
+        while True:
+            try:
+                self.sample()
+                self.failing = False
+            except Exception:
+                self.errors += 1
+                if not self.failing:
+                    self.failing = True
+                    traceback.print_exc()
+                    if self.onError is not None:
+                        self.onError()
+            deadline += 1.0 / self.rate
+            now = time.monotonic()
+            if now > deadline:
+                deadline = now
+            else:
+                time.sleep(deadline - now)
+
+    def stats(self):
+        return {'samples': self.seq, 'errors': self.errors, 'rate': self.rate, 'sampleTime': self.sampleTime.stats()}
+
+
+# 单轴处理: 中值滤波去掉尖峰, 指数滤波平滑, 死区加滞回防止在边缘抖动,
+# 最后把偏移量映射为 -1..1 的连续速度比例 (expo 越大中间越细腻)。
+# Per-axis processing: a median filter removes spikes, an exponential filter smooths,
+# a deadzone with hysteresis stops chatter at its edge, and the deflection is mapped
+# to a continuous -1..1 speed fraction (a larger expo gives finer control near the centre).
+class AxisFilter:
+    def __init__(self, deadzone=0.15, hysteresis=0.05, median=3, alpha=0.5, expo=2.0, center=128):
+        self.deadzone = deadzone
+        self.hysteresis = hysteresis
+        self.alpha = alpha
+        self.expo = expo
+        self.center = center
+        self.window = collections.deque(maxlen=median)
+        self.value = 0.0
+        self.active = False
+
+    def update(self, raw):
+        x = min(max((raw - self.center) / 127.5, -1.0), 1.0)
+        self.window.append(x)
+        median = sorted(self.window)[len(self.window) // 2]
+        self.value += self.alpha * (median - self.value)
+        magnitude = abs(self.value)
+        if self.active:
+            self.active = magnitude >= self.deadzone
+        else:
+            self.active = magnitude > self.deadzone + self.hysteresis
+        if not self.active:
+            return 0.0
+        out = min((magnitude - self.deadzone) / (1.0 - self.deadzone), 1.0) ** self.expo
+        return out if self.value > 0 else -out
+
+
+# 滤波参数表 {轴号: {参数: 值}}, 键 '*' 为所有轴的默认值, 参数为 AxisFilter 的参数
+# (deadzone, hysteresis, median, alpha, expo, center)。spec 为 JSON 文本, 如
+# '{"*": {"deadzone": 0.2}, "2": {"expo": 1.0}}', 空时全部使用默认值。
+# Filter settings {axis: {name: value}}; the key '*' holds the defaults for every axis and the
+# names are AxisFilter's arguments (deadzone, hysteresis, median, alpha, expo, center). spec is
+# JSON text such as '{"*": {"deadzone": 0.2}, "2": {"expo": 1.0}}'; empty keeps the defaults.
+def openFilters(spec=''):
+    if not spec:
+        return {}
+    filters = {}
+    for axis, settings in json.loads(spec).items():
+        filters[axis if axis == '*' else int(axis)] = dict(settings)
+    return filters
+
+
+# 按键通过边沿检测中断处理, 不再轮询。硬件去抖 (bouncetime) 之外再做软件去抖:
+# 距上次有效按下不足 debounce 秒的边沿都丢弃。不检查回调时的电平: 触点抖动时按下后
+# 电平常常还是高, 之后稳定下来的边沿又被 bouncetime 屏蔽, 按键会整个丢失。
+# 回调参数为边沿的 time.monotonic() 时间, 可直接作为命令的 stamp, 用来统计按键到动作的延迟。
+# Buttons handled by edge-detect interrupts instead of polling. On top of the driver's
+# bouncetime, edges that come less than `debounce` seconds after the last accepted press
+# are dropped. The level is not checked in the callback: a bouncing contact often still reads
+# high right after the first falling edge, and bouncetime hides the edges that follow, so the
+# press would be lost. Handlers get the time.monotonic() of the edge, which can be used as a
+# command stamp to measure button-to-action latency.
+class ButtonInput:
+    def __init__(self, handlers, debounce=0.05, bouncetime=20):
+        self.handlers = dict(handlers) # pin: handler(stamp)
+        self.debounce = debounce
+        self.bouncetime = bouncetime # 毫秒 / ms
+        self.lastPress = {}
+        self.presses = 0
+        self.bounces = 0
+        self.dispatchTime = LatencyStats() # 边沿到处理函数返回的时间 / edge to handler return
+
+    def setup(self):
+        for pin in self.handlers:
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(pin, GPIO.FALLING, callback=self.edge, bouncetime=self.bouncetime)
+
+    def edge(self, pin):
+        stamp = time.monotonic()
+        last = self.lastPress.get(pin)
+        if last is not None and stamp - last < self.debounce:
+            self.bounces += 1
+            return
+        self.lastPress[pin] = stamp
+        self.presses += 1
+        self.handlers[pin](stamp)
+        self.dispatchTime.record(time.monotonic() - stamp)
+
+    def stop(self):
+        for pin in self.handlers:
+            GPIO.remove_event_detect(pin)
+
+    def stats(self):
+        return {'presses': self.presses, 'bounces': self.bounces, 'dispatchTime': self.dispatchTime.stats()}
+
+
+# 摇杆到舵机的完整处理: 采样 -> 滤波 -> 查表 -> 发送命令。
+# layers 为 {层名: {轴号: AxisMap}}, 按键可以切换当前层 (例如右摇杆控制舵机 D 还是 E)。
+# 每个样本只遍历当前层的表, 速度变化不小于 speedStep 时才发送新的 Jog, 停止的关节发送 Stop。
+# filters 为每个轴的 AxisFilter 参数 (见 openFilters)。
+# The whole joystick-to-servo pipeline: sample -> filter -> table lookup -> commands.
+# layers is {name: {axis: AxisMap}}; buttons can switch the current layer (e.g. whether the
+# right stick moves servo D or E). Each sample walks only the current layer's table; a new
+# Jog is posted when the speed changes by speedStep or more and a Stop when a joint is released.
+# filters holds each axis's AxisFilter settings (see openFilters).
+class Joystick:
+    def __init__(self, target, layers, buttons=None, source=None, rate=200, speed=2.0, speedStep=0.05, report=print, filters=None):
+        self.target = target
+        self.layers = layers
+        self.layer = next(iter(layers))
+        self.sampler = InputSampler(rate, source, onError=self.stopAll)
+        self.buttons = ButtonInput(buttons or {})
+        filters = filters or {}
+        self.filters = {}
+        for axes in layers.values():
+            for axis in axes:
+                if axis not in self.filters:
+                    settings = dict(filters.get('*', {}))
+                    settings.update(filters.get(axis, {}))
+                    self.filters[axis] = AxisFilter(**settings)
+        self.speed = speed # 摇杆推到底时的速度 / speed at full deflection
+        self.speedStep = speedStep
+        self.jogging = {} # 正在转动的舵机及速度 / jogged servos and their speed
+        self.state = None
+        self.report = report
+        self.latency = LatencyStats() # 样本从采样到被处理的时间 / age of a sample when it is handled
+
+    def setup(self):
+        self.sampler.source.setup()
+        self.buttons.setup()
+
+    def setState(self, state):
+        if state != self.state:
+            self.state = state
+            if self.report is not None:
+                self.report(state)
+
+    # 当前层每个关节带方向的速度 / Signed speed of every joint in the current layer.
+    def velocities(self, axes):
+        jogs = {}
+        state = 'home'
+        for axis, mapping in self.layers[self.layer].items():
+            deflection = self.filters[axis].update(axes[axis])
+            if deflection:
+                jogs[mapping.joint] = mapping.sign * deflection * self.speed
+                state = mapping.labels[deflection > 0]
+        return jogs, state
+
+    def handle(self, sample):
+        jogs, state = self.velocities(sample.axes)
+        jogging = {}
+        for ID, speed in jogs.items():
+            last = self.jogging.get(ID, 0.0)
+            if abs(speed - last) >= self.speedStep or (speed > 0) != (last > 0):
+                self.target.singleServo(ID, 1 if speed > 0 else -1, abs(speed), sample.stamp)
+                last = speed
+            jogging[ID] = last
+        for ID in self.jogging:
+            if ID not in jogging:
+                self.target.stopWiggle(ID, sample.stamp)
+        if jogs or self.jogging: # 按键状态保持到摇杆移动 / a button state lasts until the stick moves
+            self.setState(state)
+        self.jogging = jogging
+
+    # 停止所有正在转动的舵机, 采样出错时由采样线程调用。
+    # Stop every joint being moved; called by the sampler thread when sampling fails.
+    def stopAll(self):
+        jogging, self.jogging = self.jogging, {}
+        for ID in jogging:
+            self.target.stopWiggle(ID)
+
+    def start(self):
+        self.sampler.start()
+
+    # 只处理最新的样本, 不会阻塞采样线程 / Handle only the newest sample; never blocks the sampler.
+    def loop(self):
+        seq = 0
+        while True:
+            sample = self.sampler.latest
+            if sample is not None and sample.seq != seq:
+                seq = sample.seq
+                self.handle(sample)
+                self.latency.record(time.monotonic() - sample.stamp)
+            time.sleep(0.5 / self.sampler.rate)
+
+    def stats(self):
+        return {'sampler': self.sampler.stats(), 'buttons': self.buttons.stats(), 'latency': self.latency.stats()}
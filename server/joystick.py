@@ -1,47 +1,36 @@
-import RPi.GPIO as GPIO
-import PCF8591 as ADC
+import os
+from hardware import GPIO
+import inputDevice
 import time
 
 btn = 11	# Define button pin
 
-def setup():
-    ADC.setup(0X48)
-    GPIO.setmode(GPIO.BOARD)	# Numbers GPIOs by physical location
-    GPIO.setup(btn, GPIO.IN, pull_up_down=GPIO.PUD_UP)	# Setup button pin as input an pull it up
-    global state
-
-def direction():    #get joystick result
-    state = ['home', 'up', 'down', 'left', 'right', 'pressed']
-    i = 0   
+# 摇杆方向表, 只打印方向不控制舵机 / Direction table; prints the direction without moving servos.
+layers = {
+    '': {
+        0: inputDevice.AxisMap(0, 1, ('up', 'down')),
+        1: inputDevice.AxisMap(1, 1, ('left', 'right')),
+    },
+}
 
-    if ADC.read(0) <= 5:
-        i = 1        #up
-    if ADC.read(0) >= 200: 
-        i = 2        #down
+class Display:
+    def singleServo(self, ID, direction, speed, stamp=None):
+        pass
 
-    if ADC.read(1) <= 5: 
-        i = 3        #left
-    if ADC.read(1) >= 200:
-        i = 4        #right
+    def stopWiggle(self, ID=None, stamp=None):
+        pass
 
-    if GPIO.input(btn) == 0:
-        i = 5        # Button pressed 
+joystick = inputDevice.Joystick(Display(), layers, {btn: lambda stamp: joystick.setState('pressed')}, rate=50,
+                                filters=inputDevice.openFilters(os.environ.get('ROBOT_INPUT_FILTER', ''))) # 滤波参数 / filter settings
 
-    if GPIO.input(btn) == 1 and ADC.read(1) - 125 < 15 and ADC.read(1) - 125 > -15 and ADC.read(2) == 255:
-        i = 0
-    
-    return state[i]
+def setup():
+    GPIO.setmode(GPIO.BOARD)	# Numbers GPIOs by physical location
+    joystick.setup()	# ADC and button pin (pulled up, with edge detection)
 
 def loop(): 
-    status = ''
     while True:
-        tmp = direction()
-        if tmp != None and tmp != status: 
-            print(tmp)
-            # z x y
-            # print("z x y: ",GPIO.input(btn), ADC.read(1), ADC.read(2))
-            status = tmp
-        time.sleep(0.1)
+        joystick.handle(joystick.sampler.sample())	# prints the direction when it changes
+        time.sleep(0.02)
 
 def destroy():
     GPIO.cleanup()                     # Release resource
@@ -52,7 +41,3 @@ if __name__ == '__main__':        # Program start from here
         loop()
     except KeyboardInterrupt:      # When 'Ctrl+C' is pressed, the child program destroy() will be  executed.
         destroy()
-
-
-
-
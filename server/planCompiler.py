@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# File name   : planCompiler.py
+# Description : Cache of compiled plans.
+#               A compiled plan is a binary table of per-tick PCA9685 pulse values
+#               (and the matching angles) for all joints, memory-mapped from disk.
+#               The file name is a hash of the plan and the calibration, so editing
+#               plan.json or the servo calibration invalidates it.
+import os
+import json
+import time
+import hashlib
+import tempfile
+import struct
+import numpy as np
+
+curPath = os.path.realpath(__file__)
+cacheDir = os.path.join(os.path.dirname(curPath), 'plancache')
+
+MAGIC = b'ADRPLAN1'
+HEADER = struct.Struct('<8sII') # magic, ticks, joints
+TMP_AGE = 10.0 # 超过这个秒数的临时文件是被中断的写入留下的 / temporary files older than this (s) were left by an interrupted write
+
+
+# 编译后的动作表 / A compiled plan table.
+class PlanTable:
+    def __init__(self, path, ticks, joints):
+        self.path = path
+        self.ticks = ticks
+        self.joints = joints
+        self.pulses = np.memmap(path, dtype='<u2', mode='r', offset=HEADER.size, shape=(ticks, joints))
+        self.angles = np.memmap(path, dtype='u1', mode='r', offset=HEADER.size + 2 * ticks * joints, shape=(ticks, joints))
+
+
+# 动作与校准参数的哈希值 / Hash of the plan and the calibration.
+def cacheKey(plan, calibration):
+    content = json.dumps({'plan': plan, 'calibration': calibration}, sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def cachePath(key):
+    return os.path.join(cacheDir, key + '.bin')
+
+
+# 读取缓存的动作表, 不存在或格式不对时返回 None。
+# Map a cached plan table; returns None if it is missing or not a valid table.
+def load(key):
+    path = cachePath(key)
+    try:
+        with open(path, 'rb') as f:
+            magic, ticks, joints = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or os.path.getsize(path) != HEADER.size + 3 * ticks * joints:
+            return None
+    except (OSError, struct.error):
+        return None
+    if ticks == 0:
+        return None
+    return PlanTable(path, ticks, joints)
+
+
+# 保存动作表并删除过期的缓存, 包括进程在写入中被结束时留下的临时文件。没有运动 (0 个节拍) 时不保存, 返回 None。
+# 每次写入使用单独的临时文件, 硬件线程和控制线程可以同时编译同一个动作。
+# Save a plan table and remove stale cache files, including the temporary files of a process
+# killed in the middle of a write. A table without motion (0 ticks) is not
+# saved and None is returned. Every writer uses its own temporary file, so the hardware and
+# control threads may compile the same plan at the same time.
+def save(key, pulses, angles, joints=5):
+    pulses = np.ascontiguousarray(pulses, dtype='<u2').reshape(-1, joints)
+    angles = np.ascontiguousarray(angles, dtype='u1').reshape(-1, joints)
+    if pulses.shape[0] == 0:
+        return None
+    os.makedirs(cacheDir, exist_ok=True)
+    path = cachePath(key)
+    fd, tmpPath = tempfile.mkstemp(suffix='.tmp', dir=cacheDir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, pulses.shape[0], pulses.shape[1]))
+            f.write(pulses.tobytes())
+            f.write(angles.tobytes())
+        os.replace(tmpPath, path)
+    except OSError:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+    now = time.time()
+    for name in os.listdir(cacheDir):
+        other = os.path.join(cacheDir, name)
+        try:
+            if name.endswith('.bin') and name != key + '.bin':
+                os.remove(other)
+            elif name.endswith('.tmp') and now - os.path.getmtime(other) > TMP_AGE:
+                os.remove(other)
+        except OSError: # 另一个线程已删除 / already removed by another thread
+            pass
+    return load(key)
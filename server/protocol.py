@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# File name   : protocol.py
+# Description : Binary websocket protocol, used alongside the JSON text messages.
+#               Text frames stay JSON; a client that sends binary frames gets binary
+#               replies. It starts with HELLO to agree on the version. Every frame begins
+#               with a one-byte type and is packed with struct (little endian):
+#
+#               HELLO      0x01  version                       -> HELLO version
+#               JOG        0x10  joint, direction (int8), speed (float32)
+#               JOG_STOP   0x11  joint (0xFF: all joints)
+#               GOTO       0x12  count, count x angle (uint8, degrees)
+#               SETPOINT   0x13  client time (float64, s), count, count x angle (float32, degrees)
+#               PLAN       0x20  action (0 stop, 1 run, 2 create, 3 save position, 4 save plan)
+#               GET_STATE  0x30                                -> JOINT_STATE
+#               GET_INFO   0x31                                -> INFO
+#               SUBSCRIBE  0x32  interval (uint16, ms; 0 unsubscribes) -> TELEMETRY frames
+#
+#               JOINT_STATE 0x80 flags (bit 0: moving), count, count x angle (uint8)
+#               INFO        0x81 CPU temperature, CPU use, RAM use (3 x float32)
+#               TELEMETRY   0x82 flags, count, CPU temperature, CPU use, RAM use (3 x float32),
+#                                count x angle (uint8)
+#               ACK         0x7F request type, status (0 ok, 1 error, 2 unknown command)
+#               Requests are decoded to a command name and arguments for commandRegistry.
+import math
+import struct
+
+VERSION = 1
+
+HELLO = 0x01
+JOG = 0x10
+JOG_STOP = 0x11
+GOTO = 0x12
+SETPOINT = 0x13
+PLAN = 0x20
+GET_STATE = 0x30
+GET_INFO = 0x31
+SUBSCRIBE = 0x32
+ACK = 0x7F
+JOINT_STATE = 0x80
+INFO = 0x81
+TELEMETRY = 0x82
+
+ALL_JOINTS = 0xFF
+PLAN_ACTIONS = ('stop', 'plan', 'create_plan', 'save_pos', 'save_plan')
+ACK_OK = 0
+ACK_ERROR = 1
+ACK_UNKNOWN = 2
+
+HELLO_FRAME = struct.Struct('<BB')
+JOG_FRAME = struct.Struct('<BBbf')
+JOG_STOP_FRAME = struct.Struct('<BB')
+COUNT_FRAME = struct.Struct('<BB') # GOTO 的类型和个数, 后跟角度 / GOTO type and count, followed by the angles
+PLAN_FRAME = struct.Struct('<BB')
+SETPOINT_HEADER = struct.Struct('<BdB')
+STATE_HEADER = struct.Struct('<BBB')
+INFO_FRAME = struct.Struct('<Bfff')
+SUBSCRIBE_FRAME = struct.Struct('<BH')
+TELEMETRY_HEADER = struct.Struct('<BBBfff')
+ACK_FRAME = struct.Struct('<BBB')
+
+
+def hello():
+    return HELLO_FRAME.pack(HELLO, VERSION)
+
+
+# nan 与 inf 不是有效的速度或角度 / nan and inf are not valid speeds or angles.
+def finite(values):
+    for value in values:
+        if not math.isfinite(value):
+            raise ValueError("not a finite number: %s" % value)
+    return values
+
+
+def decodeJog(frame):
+    kind, joint, direction, speed = JOG_FRAME.unpack(frame)
+    finite([speed])
+    return 'jog', [joint, direction, speed]
+
+
+def decodeJogStop(frame):
+    kind, joint = JOG_STOP_FRAME.unpack(frame)
+    return 'jog_stop', [] if joint == ALL_JOINTS else [joint]
+
+
+# GOTO 转换为逐个舵机的 angle 命令不合适, 解码为目标角度列表交给 goto 命令。
+# GOTO is decoded to the list of goal angles for the 'goto' command.
+def decodeGoto(frame):
+    kind, count = COUNT_FRAME.unpack_from(frame)
+    if len(frame) != COUNT_FRAME.size + count:
+        raise ValueError("GOTO frame of %d bytes for %d joints" % (len(frame), count))
+    return 'goto', list(frame[COUNT_FRAME.size:])
+
+
+# 流式设定值, 角度为浮点数以便平滑插值 / A streamed setpoint; float angles keep the interpolation smooth.
+def decodeSetpoint(frame):
+    kind, t, count = SETPOINT_HEADER.unpack_from(frame)
+    if len(frame) != SETPOINT_HEADER.size + 4 * count:
+        raise ValueError("SETPOINT frame of %d bytes for %d joints" % (len(frame), count))
+    return 'setpoint', finite([t] + list(struct.unpack_from('<%df' % count, frame, SETPOINT_HEADER.size)))
+
+
+def decodePlan(frame):
+    kind, action = PLAN_FRAME.unpack(frame)
+    if action >= len(PLAN_ACTIONS):
+        raise ValueError("unknown plan action: %d" % action)
+    return PLAN_ACTIONS[action], []
+
+
+def decodeSubscribe(frame):
+    kind, interval = SUBSCRIBE_FRAME.unpack(frame)
+    return 'subscribe', [interval / 1000.0]
+
+
+decoders = {
+    JOG: decodeJog,
+    JOG_STOP: decodeJogStop,
+    GOTO: decodeGoto,
+    SETPOINT: decodeSetpoint,
+    PLAN: decodePlan,
+    GET_STATE: lambda frame: ('get_state', []),
+    GET_INFO: lambda frame: ('get_info', []),
+    SUBSCRIBE: decodeSubscribe,
+}
+
+
+# 解码一个请求, 返回 (命令名, 参数)。格式错误时抛出 ValueError。
+# Decode a request to (command name, arguments). Raises ValueError for a malformed frame.
+def decode(frame):
+    if not frame:
+        raise ValueError("empty frame")
+    decoder = decoders.get(frame[0])
+    if decoder is None:
+        raise ValueError("unknown frame type: 0x%02x" % frame[0])
+    try:
+        return decoder(frame)
+    except struct.error as e:
+        raise ValueError(str(e))
+
+
+def ack(kind, status=ACK_OK):
+    return ACK_FRAME.pack(ACK, kind, status)
+
+
+def jointState(angles, moving=False):
+    angles = [min(max(int(round(angle)), 0), 255) for angle in angles]
+    return STATE_HEADER.pack(JOINT_STATE, 1 if moving else 0, len(angles)) + bytes(angles)
+
+
+def telemetry(angles, moving, system):
+    angles = [min(max(int(round(angle)), 0), 255) for angle in angles]
+    return TELEMETRY_HEADER.pack(TELEMETRY, 1 if moving else 0, len(angles), *[float(value) for value in system]) + bytes(angles)
+
+
+# 把命令的 response 编码为回复帧, kind 为请求的类型。
+# Encode a command's response as the reply frame; kind is the request type.
+def encode(kind, response):
+    if response['status'] != 'ok':
+        return ack(kind, ACK_ERROR)
+    if response['title'] == 'get_state':
+        return jointState(response['data']['angles'], response['data']['moving'])
+    if response['title'] == 'get_info':
+        return INFO_FRAME.pack(INFO, *[float(value) for value in response['data']])
+    return ack(kind)
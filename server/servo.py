@@ -7,17 +7,8 @@
 # sudo pip3 install adafruit-circuitpython-pca9685
 '''
 import time
-from board import SCL, SDA
-import busio
-from adafruit_motor import servo
-from adafruit_pca9685 import PCA9685
-
-
-i2c = busio.I2C(SCL, SDA)
-# Create a simple PCA9685 class instance.
-pca = PCA9685(i2c, address=0x40) #default 0x40
-
-pca.frequency = 50
+# The PCA9685 instance and the per-channel servo objects are shared with RPIservo.
+from servoDriver import pca, set_angle
 
 # servo7 = servo.Servo(pca.channels[7], min_pulse=580, max_pulse=2350)
 # servo7 = servo.Servo(pca.channels[7], min_pulse=500, max_pulse=2600)
@@ -27,9 +18,6 @@ pca.frequency = 50
 # The pulse range is 750 - 2250 by default. This range typically gives 135 degrees of
 # range, but the default is to use 180 degrees. You can specify the expected range if you wish:
 # servo7 = servo.Servo(pca.channels[7], actuation_range=135)
-def set_angle(ID, angle):
-    servo_angle = servo.Servo(pca.channels[ID], min_pulse=500, max_pulse=2400,actuation_range=180)
-    servo_angle.angle = angle
 '''
 # You can also specify the movement fractionally.
 fraction = 0.0
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# File name   : servoCommands.py
+# Description : Typed commands for the ServoCtrl command queue.
+#               Producers (web interface, joystick, buttons) post commands; the control
+#               loop drains the queue once per tick. stamp is the time.monotonic() at which
+#               the command was produced and is filled in by ServoCtrl.post() if left None.
+import collections
+
+Jog = collections.namedtuple('Jog', ['ID', 'direction', 'speed', 'stamp'], defaults=[None]) # 舵机持续转动 / keep turning a servo
+Stop = collections.namedtuple('Stop', ['ID', 'stamp'], defaults=[None, None]) # 停止转动, ID 为 None 时全部停止 / stop turning; ID None stops all
+Goto = collections.namedtuple('Goto', ['number', 'goalPos', 'stamp'], defaults=[None]) # 移动到指定位置 / move to a position
+Angle = collections.namedtuple('Angle', ['ID', 'angle', 'stamp'], defaults=[None]) # 一个舵机的目标角度, 并入正在进行的移动 / one servo's goal, merged into the running move
+RunPlan = collections.namedtuple('RunPlan', ['plan', 'stamp'], defaults=[None, None]) # 执行动作, plan 为 None 时执行保存的动作 / run a plan; None runs the saved one
+Abort = collections.namedtuple('Abort', ['stamp'], defaults=[None]) # 中止当前动作 / abort the current motion
+Init = collections.namedtuple('Init', ['stamp'], defaults=[None]) # 回到初始位置 / return to the initial angles
+Setpoint = collections.namedtuple('Setpoint', ['t', 'angles', 'stamp'], defaults=[None]) # 流式设定值, t 为客户端时间 / streamed setpoint; t is the client's clock
+StreamEnd = collections.namedtuple('StreamEnd', ['stamp'], defaults=[None]) # 播放完已收到的设定值后结束 / finish the stream after the buffered setpoints
+
+
+# 延迟统计, 保留最近的样本用于计算百分位数。
+# Latency statistics; the most recent samples are kept for percentiles.
+class LatencyStats:
+    def __init__(self, size=1000):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        self.samples.append(latency)
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, p):
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(p / 100.0 * len(samples)))]
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+# File name   : servoDriver.py
+# Description : Shared PCA9685 servo channel registry
+import struct
+from adafruit_motor import servo
+import hardware
+pca = hardware.openPCA9685(0x40) #default 0x40
+pca.frequency = 50
+
+LED0_ON_L = 0x06 # 第一个通道的 LEDn_ON/OFF 寄存器 / LEDn_ON/OFF registers of the first channel.
+
+# 每个通道的舵机参数 (最小脉宽, 最大脉宽, 转动范围)
+# Servo parameters of each channel (min_pulse, max_pulse, actuation_range).
+servoConfig = [
+    (500, 2400, 180), (500, 2400, 180), (500, 2400, 180), (500, 2400, 180),
+    (500, 2400, 180), (500, 2400, 180), (500, 2400, 180), (500, 2400, 180),
+    (500, 2400, 180), (500, 2400, 180), (500, 2400, 180), (500, 2400, 180),
+    (500, 2400, 180), (500, 2400, 180), (500, 2400, 180), (500, 2400, 180),
+]
+
+# 舵机驱动对象在启动时创建一次，之后每次写入都复用。
+# The servo objects are created once at startup and reused for every write.
+class ServoDriver:
+    def __init__(self, pca, config):
+        self.pca = pca
+        self.config = list(config)
+        self.frequency = pca.frequency
+        self.servos = []
+        self.dutyRange = []
+        for ID in range(0, len(self.config)):
+            min_pulse, max_pulse, actuation_range = self.config[ID]
+            self.servos.append(servo.Servo(pca.channels[ID], min_pulse=min_pulse, max_pulse=max_pulse, actuation_range=actuation_range))
+            # 与 adafruit_motor 相同的换算 / Same conversion as adafruit_motor.
+            min_duty = int((min_pulse * self.frequency) / 1000000 * 0xFFFF)
+            max_duty = (max_pulse * self.frequency) / 1000000 * 0xFFFF
+            self.dutyRange.append((min_duty, int(max_duty - min_duty)))
+        self.staged = {}
+        # 每个通道最后写入的 LEDn_OFF 值, 未变化的写入被跳过。
+        # Shadow of the last LEDn_OFF value written to each channel; unchanged writes are dropped.
+        self.pulse = [None] * len(self.config)
+        self.writeHits = 0 # 被跳过的写入 / writes skipped
+        self.writeMisses = 0 # 实际写入的通道 / channel writes sent to the chip
+        self.transactions = 0
+
+    def channel(self, ID):
+        return self.servos[ID]
+
+    # 设置舵机旋转角度 / Set the servo rotation angle.
+    def set_angle(self, ID, angle):
+        pulse = self.angleToPulse(ID, angle)
+        if self.pulse[ID] == pulse:
+            self.writeHits += 1
+            return
+        self.servos[ID].angle = angle
+        self.pulse[ID] = pulse
+        self.writeMisses += 1
+        self.transactions += 1
+
+    # 角度换算为 12 位 LEDn_OFF 值 / Convert an angle to the 12-bit LEDn_OFF value.
+    def angleToPulse(self, ID, angle):
+        actuation_range = self.config[ID][2]
+        if angle < 0 or angle > actuation_range:
+            raise ValueError("Angle out of range")
+        min_duty, duty_range = self.dutyRange[ID]
+        return (min_duty + int(angle / actuation_range * duty_range)) >> 4
+
+    # 暂存一帧中某个舵机的目标角度 / Stage the target angle of a servo in the current frame.
+    def stage(self, ID, angle):
+        self.staged[ID] = self.angleToPulse(ID, angle)
+
+    # 暂存已换算好的 LEDn_OFF 值 / Stage a precomputed LEDn_OFF value.
+    def stagePulse(self, ID, pulse):
+        self.staged[ID] = pulse
+
+    # 校准参数, 变化时编译好的动作表失效 / Calibration; compiled plans are invalidated when it changes.
+    def calibration(self):
+        return {'frequency': self.frequency, 'config': self.config}
+
+    # 将暂存的帧一次写入, 只写入有变化的通道, 相邻的通道合并为一次自增块写入。
+    # Flush the staged frame. Only changed channels are written, and neighbouring
+    # channels go out as one auto-increment block write.
+    def commit(self):
+        IDs = []
+        for ID in sorted(self.staged):
+            if self.staged[ID] == self.pulse[ID]:
+                self.writeHits += 1
+            else:
+                self.pulse[ID] = self.staged[ID]
+                IDs.append(ID)
+        self.staged.clear()
+        if not IDs:
+            return 0
+        writes = 0
+        first = IDs[0]
+        for i in range(1, len(IDs) + 1):
+            # 中间未变化但已知的通道一起写入, 避免拆成两次传输。
+            # Unchanged channels with a known value in between are rewritten rather than splitting the transaction.
+            if i == len(IDs) or None in self.pulse[IDs[i - 1] + 1:IDs[i]]:
+                self.writeBlock(first, self.pulse[first:IDs[i - 1] + 1])
+                writes += 1
+                if i < len(IDs):
+                    first = IDs[i]
+        self.writeMisses += len(IDs)
+        self.transactions += writes
+        return writes
+
+    # 写入统计 / Write statistics.
+    def stats(self):
+        return {'hits': self.writeHits, 'misses': self.writeMisses, 'transactions': self.transactions}
+
+    def resetStats(self):
+        self.writeHits = 0
+        self.writeMisses = 0
+        self.transactions = 0
+
+    def writeBlock(self, first, pulses):
+        buf = bytearray(1 + 4 * len(pulses))
+        buf[0] = LED0_ON_L + 4 * first
+        for i in range(0, len(pulses)):
+            struct.pack_into('<HH', buf, 1 + 4 * i, 0, pulses[i])
+        with self.pca.i2c_device as i2c:
+            i2c.write(buf)
+
+driver = ServoDriver(pca, servoConfig)
+
+def set_angle(ID, angle):
+    driver.set_angle(ID, angle)
+
+def stage(ID, angle):
+    driver.stage(ID, angle)
+
+def stagePulse(ID, pulse):
+    driver.stagePulse(ID, pulse)
+
+def commit():
+    return driver.commit()
+
+def stats():
+    return driver.stats()
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# File name   : setpointStream.py
+# Description : Jitter buffer for streamed joint setpoints.
+#               A client sends setpoints stamped with its own clock (seconds) at its own
+#               rate. The buffer maps the client clock onto time.monotonic() with the
+#               smallest transit time seen recently, and plays the stream back `delay`
+#               seconds behind it. Every control tick samples the buffer, interpolating
+#               linearly between the two setpoints around the playout time, so setpoints
+#               that arrive late or in bursts still give evenly spaced motion.
+#               The delay follows the recent jitter (the largest transit time above the
+#               smallest one), between minDelay and maxDelay. It starts halfway and changes by
+#               at most `slew` seconds per second, so playback only runs slightly slower
+#               or faster and never jumps. A setpoint that arrives after its playout time
+#               is still used if it is the newest one, otherwise it is dropped. When the
+#               stream runs dry the last setpoint is held, and after `hold` seconds (or at
+#               once after end()) the stream is finished.
+import bisect
+import collections
+
+
+class JitterBuffer:
+    def __init__(self, minDelay=0.05, maxDelay=0.3, hold=0.25, size=64, window=50, slew=0.2):
+        self.minDelay = minDelay
+        self.maxDelay = maxDelay
+        self.delay = (minDelay + maxDelay) / 2
+        self.target = minDelay
+        self.slew = slew
+        self.lastSample = None
+        self.hold = hold
+        self.size = size
+        self.times = [] # 按客户端时间排序 / sorted client times
+        self.points = [] # 与 times 对应的角度列表 / the angles for each time
+        self.transit = collections.deque(maxlen=window) # 最近的 (到达时间 - 客户端时间) / recent arrival minus client time
+        self.offset = None
+        self.ended = False
+        self.counts = collections.Counter()
+
+    # 客户端时间 t 在 now 时刻应播放的位置 / The client time played back at `now`.
+    def playTime(self, now):
+        return now - self.offset - self.delay
+
+    # 加入一个设定值, arrival 为收到的时间。晚到并且不是最新的设定值被丢弃, 返回 False。
+    # Add a setpoint received at `arrival`. Returns False when it is dropped: late and older than a buffered one.
+    def push(self, t, angles, arrival):
+        self.counts['received'] += 1
+        self.transit.append(arrival - t)
+        self.offset = min(self.transit)
+        self.target = min(max(max(self.transit) - self.offset, self.minDelay), self.maxDelay)
+        if t <= self.playTime(arrival):
+            self.counts['late'] += 1
+            if self.times and t <= self.times[-1]:
+                self.counts['dropped'] += 1
+                return False
+        i = bisect.bisect_left(self.times, t)
+        if i < len(self.times) and self.times[i] == t:
+            self.points[i] = list(angles)
+        else:
+            self.times.insert(i, t)
+            self.points.insert(i, list(angles))
+        if len(self.times) > self.size:
+            del self.times[0]
+            del self.points[0]
+            self.counts['overflow'] += 1
+        self.ended = False
+        return True
+
+    def end(self):
+        self.ended = True
+
+    # 在 now 时刻的设定值, 还没到第一个设定值时返回 None。
+    # The setpoint at `now`; None until playback reaches the first setpoint.
+    def sample(self, now):
+        if not self.times:
+            return None
+        if self.lastSample is not None:
+            step = self.slew * (now - self.lastSample)
+            self.delay = min(max(self.target, self.delay - step), self.delay + step)
+        self.lastSample = now
+        t = self.playTime(now)
+        while len(self.times) >= 2 and self.times[1] <= t:
+            del self.times[0]
+            del self.points[0]
+        if t < self.times[0]:
+            return None if self.counts['played'] == 0 else self.points[0]
+        self.counts['played'] += 1
+        if len(self.times) == 1:
+            if t > self.times[0]:
+                self.counts['underruns'] += 1 # 数据不够, 保持最后一个设定值 / ran dry: hold the last setpoint
+            return self.points[0]
+        t0, t1 = self.times[0], self.times[1]
+        a0, a1 = self.points[0], self.points[1]
+        f = (t - t0) / (t1 - t0)
+        return [a0[i] + (a1[i] - a0[i]) * f if i < len(a1) else a0[i] for i in range(0, len(a0))]
+
+    # 最后一个设定值已播放完, 并且超过 hold 秒 (end() 之后立即) 没有新的设定值。
+    # The last setpoint has been played and nothing newer came for `hold` seconds (at once after end()).
+    def finished(self, now):
+        if not self.times:
+            return self.ended or self.offset is None
+        return self.playTime(now) - self.times[-1] > (0.0 if self.ended else self.hold)
+
+    def stats(self):
+        result = {name: self.counts[name] for name in ('received', 'late', 'dropped', 'overflow', 'played', 'underruns')}
+        result['depth'] = len(self.times)
+        result['delay'] = self.delay
+        result['targetDelay'] = self.target
+        return result
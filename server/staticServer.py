@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+# File name   : staticServer.py
+# Description : Plain HTTP on the websocket server.
+#               StaticSite.process_request is given to websockets.serve(): a websocket
+#               upgrade goes on to the handshake, while any other GET is answered here with
+#               the web interface from dist/ (the same routes the Flask app served) or the
+#               /health endpoint. Pages, API and websocket then share one asyncio loop and port.
+#               Files are kept in memory with gzip (and brotli, if installed) variants and a
+#               strong ETag. preload() loads index.html and the assets it references at
+#               startup; other files are loaded on first request. Hashed bundle names
+#               (app.74b51cf6.js) are sent as immutable, everything else is revalidated and
+#               answered with 304 when the ETag matches.
+# Usage       : python3 staticServer.py [port]    serves dist/ on its own (default 5000)
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import http
+import mimetypes
+import urllib.parse
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+curPath = os.path.dirname(os.path.realpath(__file__))
+
+# 与 app.py 相同的路由: URL 前缀对应 dist/ 下的目录 (先匹配较长的前缀)。
+# The routes of app.py: a URL prefix maps to a directory under dist/ (longer prefixes first).
+ROUTES = (
+    ('/api/img/icon/', 'img/icon'),
+    ('/api/img/', 'img'),
+    ('/js/', 'js'),
+    ('/css/', 'css'),
+    ('/fonts/', 'fonts'),
+    ('/', ''),
+)
+
+COMPRESSIBLE = ('.html', '.js', '.css', '.json', '.map', '.svg', '.txt', '.eot', '.ttf')
+HASHED = re.compile(r'\.[0-9a-f]{8,}\.[^/]+$') # 文件名中带内容哈希 / content hash in the file name
+REFERENCE = re.compile(r'''(?:href|src)=["']?([^"'\s>]+)|url\(["']?([^)"']+)''') # html 与 css 中引用的路径 / paths referenced from html and css
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+# 内存中的一个文件: 原始内容和压缩后的版本, 每个版本有自己的强 ETag。
+# A file in memory: the original and its compressed variants, each with its own strong ETag.
+class Asset:
+    def __init__(self, filename, body):
+        self.filename = filename
+        self.contentType = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.cacheControl = IMMUTABLE if HASHED.search(filename) else REVALIDATE
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        self.variants = {'identity': (body, '"%s"' % digest)}
+        if filename.endswith(COMPRESSIBLE):
+            self.addVariant('gzip', gzip.compress(body, 9, mtime=0), digest)
+            if brotli is not None:
+                self.addVariant('br', brotli.compress(body), digest)
+
+    def addVariant(self, encoding, body, digest):
+        if len(body) < len(self.variants['identity'][0]):
+            self.variants[encoding] = (body, '"%s-%s"' % (digest, encoding))
+
+    # 按 Accept-Encoding 选择最小的版本 / Pick the smallest variant the client accepts.
+    def select(self, acceptEncoding):
+        accepted = [value.split(';')[0].strip() for value in acceptEncoding.split(',')]
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return 'identity'
+
+
+class StaticSite:
+    def __init__(self, root=None, health=None):
+        self.root = os.path.realpath(root or os.path.join(curPath, 'dist'))
+        self.health = health # () -> dict, 加入 /health 的回复 / merged into the /health reply
+        self.start = time.monotonic()
+        self.requests = 0
+        self.assets = {} # 文件名: Asset / filename: Asset
+        self.notModified = 0
+        self.bytesSent = 0
+
+    # URL 路径对应的文件, 不存在或在 dist/ 之外时返回 None。
+    # The file for a URL path; None if it does not exist or lies outside dist/.
+    def resolve(self, path):
+        path = urllib.parse.unquote(path.split('?', 1)[0])
+        if path == '/':
+            path = '/index.html'
+        for prefix, directory in ROUTES:
+            if path.startswith(prefix):
+                filename = os.path.realpath(os.path.join(self.root, directory, path[len(prefix):]))
+                if filename.startswith(self.root + os.sep) and os.path.isfile(filename):
+                    return filename
+                return None
+        return None
+
+    def load(self, filename):
+        asset = self.assets.get(filename)
+        if asset is None:
+            with open(filename, 'rb') as f:
+                asset = Asset(filename, f.read())
+            self.assets[filename] = asset
+        return asset
+
+    # 启动时载入 index.html 及其引用的文件 (包括 css 引用的字体和图片)。
+    # Load index.html and what it references at startup, including fonts and images referenced from css.
+    def preload(self):
+        pending = ['/index.html']
+        seen = set()
+        while pending:
+            path = pending.pop()
+            filename = self.resolve(path)
+            if filename is None or filename in seen:
+                continue
+            seen.add(filename)
+            asset = self.load(filename)
+            if filename.endswith(('.html', '.css')):
+                text = asset.variants['identity'][0].decode('utf-8', 'replace')
+                for match in REFERENCE.findall(text):
+                    reference = urllib.parse.urljoin(path, match[0] or match[1]).split('#', 1)[0]
+                    if reference.startswith('/'): # 跳过其他网站 / skip other sites
+                        pending.append(reference)
+        return len(seen)
+
+    def stats(self):
+        return {'assets': len(self.assets), 'requests': self.requests, 'notModified': self.notModified,
+                'bytesSent': self.bytesSent}
+
+    def headers(self, request_headers, contentType, length):
+        headers = [('Content-Type', contentType), ('Content-Length', str(length))]
+        origin = request_headers.get('Origin')
+        if origin: # 与 flask_cors supports_credentials 相同 / as flask_cors with supports_credentials
+            headers += [('Access-Control-Allow-Origin', origin), ('Access-Control-Allow-Credentials', 'true')]
+        return headers
+
+    def healthResponse(self, request_headers):
+        data = {'status': 'ok', 'uptime': round(time.monotonic() - self.start, 1), 'static': self.stats()}
+        if self.health is not None:
+            data.update(self.health())
+        body = json.dumps(data).encode('utf-8')
+        return http.HTTPStatus.OK, self.headers(request_headers, 'application/json', len(body)), body
+
+    # websockets 的 process_request 钩子: 返回 None 时继续 websocket 握手。
+    # The process_request hook of websockets: returning None continues the websocket handshake.
+    async def process_request(self, path, request_headers):
+        if request_headers.get('Upgrade', '').lower() == 'websocket':
+            return None
+        self.requests += 1
+        if path.split('?', 1)[0] == '/health':
+            return self.healthResponse(request_headers)
+        filename = self.resolve(path)
+        if filename is None:
+            body = b'Not Found'
+            return http.HTTPStatus.NOT_FOUND, self.headers(request_headers, 'text/plain', len(body)), body
+        asset = self.assets.get(filename)
+        if asset is None: # 第一次请求时在线程中读取和压缩 / first request: read and compress off the loop
+            asset = await asyncio.get_event_loop().run_in_executor(None, self.load, filename)
+        encoding = asset.select(request_headers.get('Accept-Encoding', ''))
+        body, etag = asset.variants[encoding]
+        headers = [('ETag', etag), ('Cache-Control', asset.cacheControl), ('Vary', 'Accept-Encoding')]
+        if etag in [value.strip() for value in request_headers.get('If-None-Match', '').split(',')]:
+            self.notModified += 1
+            return http.HTTPStatus.NOT_MODIFIED, headers, b''
+        headers += self.headers(request_headers, asset.contentType, len(body))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        self.bytesSent += len(body)
+        return http.HTTPStatus.OK, headers, body
+
+
+if __name__ == '__main__':
+    import websockets
+
+    async def refuse(websocket, path):
+        await websocket.close()
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    site = StaticSite()
+    site.preload()
+    asyncio.get_event_loop().run_until_complete(websockets.serve(refuse, '0.0.0.0', port, process_request=site.process_request))
+    print('serving %s on port %d' % (site.root, port))
+    asyncio.get_event_loop().run_forever()
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# File name   : telemetry.py
+# Description : Server-push telemetry.
+#               One publisher samples the joint angles once per interval and the system
+#               stats (CPU temperature, CPU use, RAM use) at most once per systemInterval.
+#               Each sample is serialized once, as JSON and as a binary frame. Every subscribed
+#               websocket gets the same prebuilt frame at its own rate, so the cost does not
+#               grow with the number of browsers. get_info reads the cached system stats.
+#               With an actor (hardwareActor.HardwareActor) sampling runs on its thread,
+#               off the event loop.
+import time
+import json
+import asyncio
+import protocol
+from servoCommands import LatencyStats
+
+
+class Telemetry:
+    def __init__(self, sampleJoints, sampleSystem, minInterval=0.05, systemInterval=1.0, actor=None):
+        self.actor = actor
+        self.sampleJoints = sampleJoints # () -> (角度列表, 是否在运动) / (angles, moving)
+        self.sampleSystem = sampleSystem # () -> [CPU 温度, CPU 使用率, 内存使用率] / [CPU temp, CPU use, RAM use]
+        self.minInterval = minInterval
+        self.systemInterval = systemInterval
+        self.system = None
+        self.systemStamp = 0.0
+        self.frames = None # (JSON 文本, 二进制帧) / (JSON text, binary frame)
+        self.seq = 0
+        self.subscribers = {} # websocket: (间隔/interval, task)
+        self.publisher = None
+        self.sent = 0
+        self.publishTime = LatencyStats() # 每次采样和序列化的耗时 / time to sample and serialize once
+
+    # 缓存的系统状态, 过期时重新读取 / Cached system stats, read again once stale.
+    def info(self):
+        now = time.monotonic()
+        if self.system is None or now - self.systemStamp >= self.systemInterval:
+            self.system = self.sampleSystem()
+            self.systemStamp = now
+        return self.system
+
+    def publish(self):
+        start = time.monotonic()
+        angles, moving = self.sampleJoints()
+        system = self.info()
+        seq = self.seq + 1
+        text = json.dumps({'status': 'ok', 'title': 'telemetry',
+                           'data': {'seq': seq, 'angles': angles, 'moving': moving, 'info': system}})
+        self.frames = (text, protocol.telemetry(angles, moving, system))
+        self.seq = seq # 帧准备好之后再更新序号 / bump the number only once the frames are ready
+        self.publishTime.record(time.monotonic() - start)
+
+    # 采样间隔取所有订阅者中最短的 / Sample as often as the fastest subscriber asks.
+    def interval(self):
+        return max(self.minInterval, min(interval for interval, task in self.subscribers.values()))
+
+    async def run(self):
+        while self.subscribers:
+            if self.actor is not None:
+                await self.actor.call(self.publish)
+            else:
+                self.publish()
+            await asyncio.sleep(self.interval())
+        self.publisher = None
+
+    # 订阅, interval 秒发送一次; 再次订阅会替换原来的间隔。
+    # Subscribe to a frame every `interval` seconds; subscribing again replaces the interval.
+    def subscribe(self, websocket, interval, binary=False):
+        self.unsubscribe(websocket)
+        interval = max(interval, self.minInterval)
+        task = asyncio.ensure_future(self.feed(websocket, interval, binary))
+        self.subscribers[websocket] = (interval, task)
+        if self.publisher is None:
+            self.publisher = asyncio.ensure_future(self.run())
+
+    def unsubscribe(self, websocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is not None:
+            subscriber[1].cancel()
+
+    async def feed(self, websocket, interval, binary):
+        seq = None
+        try:
+            while True:
+                if self.frames is not None and seq != self.seq:
+                    seq = self.seq
+                    await websocket.send(self.frames[1 if binary else 0])
+                    self.sent += 1
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception: # 连接已关闭 / the connection is closed
+            if websocket in self.subscribers and self.subscribers[websocket][1] is asyncio.current_task():
+                del self.subscribers[websocket]
+
+    def stats(self):
+        return {'subscribers': len(self.subscribers), 'published': self.seq, 'sent': self.sent,
+                'publishTime': self.publishTime.stats()}
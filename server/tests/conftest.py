@@ -0,0 +1,7 @@
+# server/ 中的模块以模块名互相导入, 测试时把 server/ 加入 sys.path; 使用模拟硬件。
+# The modules in server/ import each other by name, so put server/ on sys.path; use the simulated hardware.
+import os
+import sys
+
+os.environ.setdefault('ROBOT_HW', 'sim')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
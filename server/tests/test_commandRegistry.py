@@ -0,0 +1,73 @@
+import pytest
+import commandRegistry
+
+
+def reply():
+    return {'status': 'ok', 'title': '', 'data': None}
+
+
+@pytest.fixture
+def registry():
+    calls = []
+    registry = commandRegistry.CommandRegistry()
+
+    @registry.command('jog', (int, int, float), 2)
+    def jog(response, ID, direction, speed=1.0):
+        calls.append(('jog', ID, direction, speed))
+
+    @registry.command('fail')
+    def fail(response):
+        calls.append(('fail',))
+        raise ValueError('failed')
+
+    registry.alias('C_add', 'jog', 2, 1)
+    registry.calls = calls
+    return registry
+
+
+def test_dispatch_and_alias(registry):
+    assert registry.dispatch('jog 1 -1 0.5', reply())
+    assert registry.dispatch('C_add', reply())
+    assert registry.dispatch('C_add 0.25', reply())
+    assert registry.calls == [('jog', 1, -1, 0.5), ('jog', 2, 1, 1.0), ('jog', 2, 1, 0.25)]
+    assert registry.stats()['jog']['count'] == 3
+
+
+def test_unknown_and_empty(registry):
+    assert not registry.dispatch('nope 1', reply())
+    assert not registry.dispatch('   ', reply())
+    assert registry.unknown == 1
+
+
+@pytest.mark.parametrize('message', ['jog 1', 'jog 1 1 1 1', 'jog x 1'])
+def test_bad_arguments_reported(registry, message):
+    response = reply()
+    assert registry.dispatch(message, response)
+    assert response['status'] == 'error' and response['title'] == 'jog'
+    assert registry.calls == []
+
+
+@pytest.mark.parametrize('messages', [['jog 1 1', 'nope'], ['jog 1 1', 'jog 1'], ['jog 1 1', ''], ['jog 1 1', 5]])
+def test_batch_checks_all_before_running(registry, messages):
+    response = reply()
+    registry.batch(messages, response)
+    assert response['status'] == 'error' and response['data'].startswith('command 1:')
+    assert registry.calls == []
+
+
+def test_batch_runs_in_order_and_stops_at_failure(registry):
+    response = reply()
+    registry.batch(['jog 0 1', 'C_add', 'fail', 'jog 3 1'], response)
+    assert response['status'] == 'error'
+    assert [result['status'] for result in response['data']] == ['ok', 'ok', 'error']
+    assert registry.calls == [('jog', 0, 1, 1.0), ('jog', 2, 1, 1.0), ('fail',)]
+
+
+def test_batch_limit(registry):
+    response = reply()
+    registry.batch(['jog 0 1'] * (registry.maxBatch + 1), response)
+    assert response['status'] == 'error'
+    assert registry.calls == []
+    response = reply()
+    registry.batch(['jog 0 1'] * registry.maxBatch, response)
+    assert response['status'] == 'ok' and len(registry.calls) == registry.maxBatch
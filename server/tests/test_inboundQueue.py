@@ -0,0 +1,97 @@
+import asyncio
+import inboundQueue
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+async def drain(inbound):
+    items = []
+    while inbound.items:
+        items.append(await inbound.get())
+    return items
+
+
+def test_latest_wins_per_key_and_order_is_kept():
+    async def main():
+        inbound = inboundQueue.InboundQueue(rate=1000.0, burst=100)
+        await inbound.put('jog 0 a', ('joint', 0))
+        await inbound.put('plan')
+        await inbound.put('jog 1', ('joint', 1))
+        await inbound.put('jog 0 b', ('joint', 0))
+        return await drain(inbound), inbound.stats()
+
+    items, stats = run(main())
+    assert items == ['plan', 'jog 1', 'jog 0 b']
+    assert (stats['received'], stats['coalesced'], stats['processed']) == (4, 1, 3)
+
+
+def test_supersedes_replaces_other_keys():
+    async def main():
+        inbound = inboundQueue.InboundQueue(rate=1000.0, burst=100)
+        await inbound.put('jog 0', ('joint', 0))
+        await inbound.put('angle 0', ('angle', 0))
+        await inbound.put('jog 2', ('joint', 2))
+        await inbound.put('stop all', 'joints', [('joint', ID) for ID in range(0, 16)])
+        return await drain(inbound)
+
+    assert run(main()) == ['angle 0', 'stop all']
+
+
+def test_put_waits_when_full():
+    async def main():
+        inbound = inboundQueue.InboundQueue(rate=1000.0, burst=100, maxsize=2)
+        await inbound.put('a')
+        await inbound.put('b')
+        blocked = asyncio.ensure_future(inbound.put('c'))
+        await asyncio.sleep(0.01)
+        assert not blocked.done() and len(inbound.items) == 2
+        assert await inbound.get() == 'a'
+        await asyncio.sleep(0)
+        assert blocked.done()
+        return await drain(inbound), inbound.stats()
+
+    items, stats = run(main())
+    assert items == ['b', 'c']
+    assert stats['blocked'] == 1 and stats['maxDepth'] == 2
+
+
+def test_close_counts_dropped():
+    async def main():
+        inbound = inboundQueue.InboundQueue()
+        await inbound.put('a')
+        await inbound.put('b')
+        inbound.close()
+        return inbound.stats()
+
+    assert run(main())['dropped'] == 2
+
+
+def test_rate_limit():
+    async def main():
+        inbound = inboundQueue.InboundQueue(rate=100.0, burst=1)
+        for i in range(0, 5):
+            await inbound.put(i)
+        start = asyncio.get_event_loop().time()
+        items = await drain(inbound)
+        return items, asyncio.get_event_loop().time() - start, inbound.stats()
+
+    items, elapsed, stats = run(main())
+    assert items == [0, 1, 2, 3, 4]
+    assert elapsed >= 0.035
+    assert stats['limited'] > 0 # 睡眠可能超时, 令牌多补充一些 / sleeps may overshoot and refill extra tokens
+
+
+def test_replaced_head_is_charged_its_own_cost():
+    async def main():
+        inbound = inboundQueue.InboundQueue(rate=10.0, burst=1)
+        await inbound.put('batch', 'k', cost=5)
+        getter = asyncio.ensure_future(inbound.get())
+        await asyncio.sleep(0.05)
+        await inbound.put('single', 'k', cost=1)
+        return await getter, inbound.bucket.tokens
+
+    item, tokens = run(main())
+    assert item == 'single'
+    assert tokens > -0.5 # 只扣了 1 个令牌 / only one token was charged
@@ -0,0 +1,96 @@
+import time
+import pytest
+import inputDevice
+
+
+class Target:
+    def __init__(self):
+        self.stopped = []
+
+    def singleServo(self, ID, direction, speed, stamp=None):
+        pass
+
+    def stopWiggle(self, ID=None, stamp=None):
+        self.stopped.append(ID)
+
+
+def test_axis_filter_deadzone_and_hysteresis():
+    axis = inputDevice.AxisFilter(deadzone=0.2, hysteresis=0.1, median=1, alpha=1.0, expo=1.0)
+    assert axis.update(128 + 0.25 * 127.5) == 0.0 # 在死区加回差之内 / inside deadzone plus hysteresis
+    assert axis.update(128 + 0.35 * 127.5) > 0.0
+    assert axis.update(128 + 0.25 * 127.5) > 0.0 # 已激活, 到死区边缘之前保持 / stays active down to the deadzone
+    assert axis.update(128 + 0.1 * 127.5) == 0.0
+    assert axis.update(0) == -1.0
+
+
+def test_open_filters():
+    assert inputDevice.openFilters('') == {}
+    assert inputDevice.openFilters('{"*": {"deadzone": 0.2}, "2": {"expo": 1.0}}') == {'*': {'deadzone': 0.2}, 2: {'expo': 1.0}}
+
+
+def test_joystick_filter_settings_per_axis():
+    layers = {'': {axis: inputDevice.AxisMap(axis, 1) for axis in range(0, 4)}}
+    joystick = inputDevice.Joystick(Target(), layers, report=None,
+                                    filters={'*': {'deadzone': 0.3}, 2: {'expo': 1.0, 'median': 5}})
+    assert [joystick.filters[axis].deadzone for axis in range(0, 4)] == [0.3] * 4
+    assert joystick.filters[2].expo == 1.0 and joystick.filters[2].window.maxlen == 5
+    assert joystick.filters[0].expo == 2.0
+
+
+def test_trace_recorder_flushes_without_close(tmp_path):
+    path = tmp_path / 'trace.bin'
+    recorder = inputDevice.TraceRecorder(str(path), flushInterval=0.0)
+    for i in range(0, 3):
+        recorder.record(inputDevice.Sample(i, 1.0 + i * 0.01, [128, 128, 128, 128]))
+    size = path.stat().st_size # 未调用 close(), 如被 SIGTERM 结束 / close() not called, as when killed by SIGTERM
+    recorder.close()
+    assert size == inputDevice.TRACE_HEADER.size + 3 * inputDevice.TRACE_RECORD.size
+    source = inputDevice.TraceSource.load(str(path))
+    assert len(source.frames) == 3
+
+
+def test_trace_records_long_recordings(tmp_path):
+    path = tmp_path / 'trace.bin'
+    recorder = inputDevice.TraceRecorder(str(path))
+    recorder.record(inputDevice.Sample(0, 0.0, [128, 128, 128, 128]))
+    recorder.record(inputDevice.Sample(1, 5 * 3600.0, [0, 255, 128, 128])) # 5 小时后 / five hours in
+    recorder.close()
+    frames = inputDevice.TraceSource.load(str(path)).frames
+    assert frames[-1][:2] == (5 * 3600.0, (0, 255, 128, 128))
+
+
+def test_sampler_error_stops_joints_and_keeps_running():
+    class Failing:
+        def setup(self):
+            pass
+
+        def read(self):
+            raise OSError('I2C read failed')
+
+    target = Target()
+    layers = {'': {0: inputDevice.AxisMap(0, 1)}}
+    joystick = inputDevice.Joystick(target, layers, source=Failing(), report=None)
+    joystick.jogging = {0: 1.0}
+    joystick.sampler.start()
+    time.sleep(0.05)
+    assert joystick.sampler.is_alive()
+    assert joystick.sampler.errors > 1
+    assert target.stopped == [0] and joystick.jogging == {}
+
+
+@pytest.mark.parametrize('content', [b'[]', b'ADRTRAC2\x11\x12\x00\x00', b'ADRTRAC2\x11\x12\x00\x00\x01\x02'])
+def test_empty_trace_is_rejected(tmp_path, content):
+    path = tmp_path / 'trace'
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        inputDevice.TraceSource.load(str(path))
+
+
+def test_button_edges_debounced_without_level_check():
+    stamps = []
+    buttons = inputDevice.ButtonInput({17: stamps.append}, debounce=0.05)
+    buttons.edge(17) # 抖动时电平可能已读为高 / the level may already read high while bouncing
+    buttons.edge(17)
+    time.sleep(0.06)
+    buttons.edge(17)
+    assert len(stamps) == 2 and (buttons.presses, buttons.bounces) == (2, 1)
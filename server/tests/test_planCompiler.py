@@ -0,0 +1,81 @@
+import os
+import threading
+import numpy as np
+import pytest
+import planCompiler
+import trajectory
+
+
+@pytest.fixture(autouse=True)
+def cacheDir(tmp_path, monkeypatch):
+    monkeypatch.setattr(planCompiler, 'cacheDir', str(tmp_path))
+    return tmp_path
+
+
+def test_save_and_load():
+    pulses = [[100, 200, 300, 400, 500], [101, 201, 301, 401, 501]]
+    angles = [[10, 20, 30, 40, 50], [11, 21, 31, 41, 51]]
+    table = planCompiler.save('k', pulses, angles)
+    assert (table.ticks, table.joints) == (2, 5)
+    assert table.pulses.tolist() == pulses
+    assert planCompiler.load('k').angles.tolist() == angles
+
+
+@pytest.mark.parametrize('waypoints', [[[90] * 5], [[90] * 5, [90] * 5]])
+def test_plan_without_motion_has_no_table(waypoints):
+    angles = trajectory.rows(trajectory.blend(waypoints, 100))
+    assert angles == []
+    assert planCompiler.save('empty', angles, angles) is None
+    assert planCompiler.load('empty') is None
+
+
+def test_stale_tables_are_removed(cacheDir):
+    planCompiler.save('old', [[1] * 5], [[1] * 5])
+    planCompiler.save('new', [[2] * 5], [[2] * 5])
+    assert sorted(p.name for p in cacheDir.iterdir()) == ['new.bin']
+
+
+def test_interrupted_writes_are_removed(cacheDir):
+    for name in ('old.bin.tmp', 'old.tmp', 'recent.tmp'):
+        (cacheDir / name).write_bytes(b'')
+    for name in ('old.bin.tmp', 'old.tmp'):
+        os.utime(cacheDir / name, (0, 0))
+    planCompiler.save('new', [[2] * 5], [[2] * 5])
+    assert sorted(p.name for p in cacheDir.iterdir()) == ['new.bin', 'recent.tmp'] # 可能正在写入 / may still be written
+
+
+def test_concurrent_saves_of_one_key(cacheDir):
+    pulses = np.ones((500, 5))
+    errors = []
+
+    def compile():
+        try:
+            for i in range(0, 20):
+                planCompiler.save('same', pulses, pulses)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=compile) for i in range(0, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(p.name for p in cacheDir.iterdir()) == ['same.bin']
+
+
+@pytest.fixture
+def servo():
+    import RPIservo
+    return RPIservo.ServoCtrl()
+
+
+def test_short_waypoints_are_padded(servo):
+    waypoints = servo.planPoints([[60, 60], [70, 70, 80], {'pos': [100]}, [1, 2, 3, 4, 5, 6]])[0]
+    assert waypoints == [[60, 60, 90, 90, 90], [70, 70, 80, 90, 90], [100, 70, 80, 90, 90], [1, 2, 3, 4, 5]]
+    assert servo.compilePlan([[60, 60], [70, 70]]).angles[-1].tolist() == [70, 70, 90, 90, 90]
+
+
+def test_broken_plan_is_not_compiled(servo):
+    assert servo.compilePlan([[60, 'x'], [70, 70]]) is None
+    assert servo.compilePlan([{'blend': 5}, [70, 70]]) is None
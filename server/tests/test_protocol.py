@@ -0,0 +1,37 @@
+import struct
+import pytest
+import protocol
+
+
+def test_decode_requests():
+    assert protocol.decode(protocol.JOG_FRAME.pack(protocol.JOG, 2, -1, 0.5)) == ('jog', [2, -1, 0.5])
+    assert protocol.decode(bytes([protocol.JOG_STOP, protocol.ALL_JOINTS])) == ('jog_stop', [])
+    assert protocol.decode(bytes([protocol.GOTO, 2, 10, 170])) == ('goto', [10, 170])
+    assert protocol.decode(bytes([protocol.PLAN, 1])) == ('plan', [])
+    assert protocol.decode(protocol.SUBSCRIBE_FRAME.pack(protocol.SUBSCRIBE, 250)) == ('subscribe', [0.25])
+    frame = protocol.SETPOINT_HEADER.pack(protocol.SETPOINT, 1.5, 2) + struct.pack('<2f', 30.0, 150.0)
+    assert protocol.decode(frame) == ('setpoint', [1.5, 30.0, 150.0])
+
+
+@pytest.mark.parametrize('frame', [
+    b'',
+    bytes([0x55]),
+    bytes([protocol.JOG, 1]),
+    bytes([protocol.GOTO, 3, 10]),
+    bytes([protocol.PLAN, len(protocol.PLAN_ACTIONS)]),
+    protocol.JOG_FRAME.pack(protocol.JOG, 0, 1, float('nan')),
+    protocol.JOG_FRAME.pack(protocol.JOG, 0, 1, float('inf')),
+    protocol.SETPOINT_HEADER.pack(protocol.SETPOINT, float('nan'), 1) + struct.pack('<f', 90.0),
+    protocol.SETPOINT_HEADER.pack(protocol.SETPOINT, 1.0, 1) + struct.pack('<f', float('nan')),
+    protocol.SETPOINT_HEADER.pack(protocol.SETPOINT, 1.0, 2) + struct.pack('<f', 90.0),
+])
+def test_malformed_frames_raise_value_error(frame):
+    with pytest.raises(ValueError):
+        protocol.decode(frame)
+
+
+def test_replies():
+    assert protocol.encode(protocol.JOG, {'status': 'ok', 'title': '', 'data': None}) == protocol.ack(protocol.JOG)
+    assert protocol.encode(protocol.JOG, {'status': 'error', 'title': 'jog', 'data': 'x'}) == protocol.ack(protocol.JOG, protocol.ACK_ERROR)
+    state = protocol.encode(protocol.GET_STATE, {'status': 'ok', 'title': 'get_state', 'data': {'angles': [90, 300, -5], 'moving': True}})
+    assert state == bytes([protocol.JOINT_STATE, 1, 3, 90, 255, 0])
@@ -0,0 +1,60 @@
+import pytest
+import setpointStream
+
+
+def buffer(**settings):
+    settings.setdefault('minDelay', 0.1)
+    settings.setdefault('maxDelay', 0.1)
+    return setpointStream.JitterBuffer(**settings)
+
+
+def test_interpolates_between_setpoints():
+    stream = buffer()
+    stream.push(0.0, [0.0, 100.0], 10.0)
+    stream.push(0.1, [10.0, 90.0], 10.1)
+    assert stream.sample(10.05) is None # 还没到第一个设定值 / playback not at the first setpoint yet
+    assert stream.sample(10.15) == pytest.approx([5.0, 95.0])
+    assert stream.sample(10.2) == pytest.approx([10.0, 90.0])
+
+
+def test_holds_last_setpoint_then_finishes():
+    stream = buffer(hold=0.25)
+    stream.push(0.0, [10.0], 10.0)
+    stream.push(0.1, [20.0], 10.1)
+    assert stream.sample(10.4) == [20.0]
+    assert stream.stats()['underruns'] == 1
+    assert not stream.finished(10.4)
+    assert stream.finished(10.5)
+
+
+def test_end_finishes_after_the_last_setpoint():
+    stream = buffer()
+    stream.push(0.0, [10.0], 10.0)
+    stream.push(0.1, [20.0], 10.1)
+    stream.end()
+    assert not stream.finished(10.15)
+    stream.sample(10.21)
+    assert stream.finished(10.21)
+
+
+def test_late_setpoints():
+    stream = buffer()
+    stream.push(0.0, [0.0], 10.0)
+    stream.push(0.1, [10.0], 10.1)
+    stream.sample(10.3)
+    assert stream.push(0.15, [15.0], 10.4) # 晚到但是最新的, 仍然使用 / late but newest: still used
+    assert not stream.push(0.12, [12.0], 10.41) # 晚到且更旧 / late and older: dropped
+    stats = stream.stats()
+    assert (stats['late'], stats['dropped']) == (2, 1)
+    assert stream.sample(10.42) == [15.0]
+
+
+def test_delay_follows_jitter_without_jumping():
+    stream = setpointStream.JitterBuffer(minDelay=0.05, maxDelay=0.3, slew=0.2)
+    stream.push(0.0, [0.0], 10.0)
+    stream.push(0.1, [0.0], 10.3) # 0.2 秒抖动 / 0.2 s of jitter
+    assert stream.target == pytest.approx(0.2)
+    delay = stream.delay
+    stream.sample(10.3)
+    stream.sample(10.4)
+    assert abs(stream.delay - delay) <= 0.2 * 0.1 + 1e-9
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import trajectory
+
+
+def peakVelocity(start, path, rate):
+    return np.max(np.abs(np.diff(np.vstack([start, path]), axis=0))) * rate
+
+
+@pytest.mark.parametrize('profile', trajectory.PROFILES)
+@pytest.mark.parametrize('maxAccel', [None, 1800.0, 200.0])
+def test_velocity_limit(profile, maxAccel):
+    path = trajectory.plan([0.0, 0.0], [90.0, -45.0], 100, profile, 90.0, maxAccel)
+    assert path[-1].tolist() == [90.0, -45.0]
+    assert peakVelocity([0.0, 0.0], path, 100) <= 90.0 * 1.001
+
+
+def test_fixed_steps_without_limits():
+    path = trajectory.plan([0.0], [30.0], 100, 'trapezoid', None, None, steps=30)
+    assert path.shape == (30, 1)
+    assert path[-1, 0] == 30.0
+
+
+def test_no_motion():
+    assert trajectory.plan([90.0] * 5, [90.0] * 5, 100, 'trapezoid', 360.0, 1800.0).shape == (0, 5)
+    assert trajectory.rows(trajectory.blend([[90] * 5], 100)) == []
+
+
+def test_blend_passes_waypoints_in_order():
+    waypoints = [[0.0], [60.0], [0.0]]
+    path = trajectory.blend(waypoints, 100, 'trapezoid', 360.0, 1800.0, radius=0.0)
+    assert path[-1, 0] == 0.0
+    assert np.isclose(path[:, 0].max(), 60.0)
+
+
+@pytest.mark.parametrize('profile', trajectory.PROFILES)
+@pytest.mark.parametrize('waypoints', [
+    [[96, 103, 90], [180, 172, 90], [0, 114, 90], [97, 115, 93]], # 反向 / reversals
+    [[0, 0], [60, 0], [60, 60], [120, 60]], # 直角 / corners
+    [[0, 0], [30, 30], [60, 60], [90, 90]], # 直线 / straight line
+])
+@pytest.mark.parametrize('radius', [10.0, 30.0])
+def test_blend_limits(profile, waypoints, radius):
+    path = trajectory.blend(waypoints, 100, profile, 360.0, 1800.0, radius)
+    assert np.allclose(path[-1], waypoints[-1])
+    velocity, accel = trajectory.peaks(np.asarray(waypoints[0], dtype=float), path, 100)
+    assert velocity.max() <= 360.0 * 1.001
+    if profile != 'linear': # linear 曲线起止处的加速度本来就不受限制 / linear moves start and stop abruptly anyway
+        assert accel.max() <= 1800.0 * 1.001
+
+
+def test_blend_rounds_corners():
+    waypoints = [[0, 0], [60, 0], [60, 60], [120, 60]]
+    stopped = trajectory.blend(waypoints, 100, 'trapezoid', 360.0, 1800.0, 0.0)
+    blended = trajectory.blend(waypoints, 100, 'trapezoid', 360.0, 1800.0, 10.0)
+    assert len(blended) < len(stopped)
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+# File name   : trajectory.py
+# Description : Vectorized joint trajectories for ServoCtrl.
+#               A move is planned once as a (steps x joints) matrix of setpoints,
+#               one row per control tick.
+import numpy as np
+
+PROFILES = ('linear', 'trapezoid', 'minjerk')
+
+# 最小加加速度曲线的峰值速度和峰值加速度系数 (距离 1, 时间 1)。
+# Peak velocity and peak acceleration of the minimum-jerk curve for unit distance and time.
+MINJERK_VELOCITY = 1.875
+MINJERK_ACCEL = 5.7735
+
+
+# 归一化的移动时间: 距离为 1, V 和 A 为归一化后最紧的速度和加速度限制。
+# Duration of a normalized move of distance 1 under the tightest normalized limits V and A.
+# Returns (duration, acceleration time).
+def timing(profile, V, A):
+    if profile == 'linear':
+        return 1.0 / V, 0.0
+    if profile == 'trapezoid':
+        if V * V / A >= 1.0: # 达不到最大速度, 三角形速度曲线 / never reaches V: triangular profile
+            ta = np.sqrt(1.0 / A)
+            return 2.0 * ta, ta
+        return 1.0 / V + V / A, V / A
+    if profile == 'minjerk':
+        return max(MINJERK_VELOCITY / V, np.sqrt(MINJERK_ACCEL / A)), 0.0
+    raise ValueError("Unknown motion profile: %s" % profile)
+
+
+# 归一化的位置曲线 s(tau), tau 和 s 都在 0..1 之间。
+# Normalized position curve s(tau); both tau and s run from 0 to 1.
+def shape(profile, tau, accelFraction=1.0 / 3):
+    if profile == 'linear':
+        return tau
+    if profile == 'trapezoid':
+        f = min(max(accelFraction, 1e-9), 0.5)
+        a = 1.0 / (f * (1.0 - f))
+        return np.where(tau < f, 0.5 * a * tau * tau,
+               np.where(tau > 1.0 - f, 1.0 - 0.5 * a * (1.0 - tau) ** 2,
+                        a * f * (tau - 0.5 * f)))
+    if profile == 'minjerk':
+        return tau ** 3 * (10.0 - 15.0 * tau + 6.0 * tau * tau)
+    raise ValueError("Unknown motion profile: %s" % profile)
+
+
+# 规划一次移动, 返回每个节拍一行的设定值矩阵, 最后一行为目标位置。
+# 给出 maxVelocity/maxAccel (度/秒, 度/秒², 可为每个关节单独设置) 时, 所有关节同步在
+# 最慢关节允许的最短时间内完成; 否则按固定步数 steps 移动。
+# Plan a move and return the setpoint matrix with one row per tick; the last row is the goal.
+# With maxVelocity/maxAccel (deg/s, deg/s², scalar or per joint) all joints finish together
+# in the shortest time the most limited joint allows; otherwise the move takes `steps` ticks.
+def plan(start, goal, rate, profile='trapezoid', maxVelocity=None, maxAccel=None, steps=30):
+    start = np.asarray(start, dtype=float)
+    delta = np.asarray(goal, dtype=float) - start
+    distance = np.abs(delta)
+    moving = distance > 0
+    if not moving.any():
+        return np.empty((0, len(start)))
+    accelFraction = 1.0 / 3
+    if maxVelocity is not None:
+        maxVelocity = np.broadcast_to(np.asarray(maxVelocity, dtype=float), start.shape)
+        maxAccel = np.broadcast_to(np.asarray(np.inf if maxAccel is None else maxAccel, dtype=float), start.shape)
+        V = np.min(maxVelocity[moving] / distance[moving])
+        A = np.min(maxAccel[moving] / distance[moving])
+        duration, accelTime = timing(profile, V, A)
+        steps = max(1, int(np.ceil(duration * rate)))
+        if accelTime:
+            accelFraction = accelTime / duration
+        elif profile == 'trapezoid': # 没有加速度限制: 匀速即为最快 / no acceleration limit: constant speed is fastest
+            profile = 'linear'
+    tau = np.arange(1, steps + 1) / float(steps)
+    return start + np.outer(shape(profile, tau, accelFraction), delta)
+
+
+# 取整后的设定值, 每行一个 Python 列表 / Rounded setpoints as one Python list per row.
+def rows(path):
+    return np.rint(path).astype(int).tolist()
+
+
+# 速度和加速度的峰值 (度/秒, 度/秒²), 每个关节一个, path 从静止的 start 开始。
+# Peak velocity and acceleration (deg/s, deg/s²) per joint of a path that starts at rest at `start`.
+def peaks(start, path, rate):
+    velocity = np.diff(np.vstack([start, start, path, path[-1:]]), axis=0) * rate
+    return np.max(np.abs(velocity), axis=0), np.max(np.abs(np.diff(velocity, axis=0)), axis=0) * rate
+
+
+# 两段叠加 n 个节拍后的位移, 从第一段的起点算起。
+# Displacement of two segments superimposed over n ticks, measured from the first one's start.
+def superimpose(delta, displacement, nextDisplacement, n):
+    end = len(displacement)
+    path = np.repeat(delta[None, :], end + len(nextDisplacement) - n, axis=0)
+    path[:end] = displacement
+    path[end - n:] += nextDisplacement
+    return path
+
+
+# 在航点附近, 前一段剩余距离不超过 radius 度的节拍数 (与下一段重叠的节拍数)。叠加后的
+# 速度和加速度是两段之和, 因此给出 maxVelocity/maxAccel 时重叠只保留到叠加后仍不超过
+# 限制 (或不超过两段不叠加时已有的峰值, 如 linear 曲线起止处的加速度) 为止: 实际上只有
+# 减速段与加速段重叠, 匀速曲线和反向的航点基本不重叠。
+# Number of trailing ticks in which the segment is within `radius` degrees of its end; the
+# next segment starts that many ticks early. Overlapping segments add their velocities and
+# accelerations, so with maxVelocity/maxAccel the overlap is cut down until the sum stays
+# within the limits (or within the peaks the two segments already have without blending,
+# such as the acceleration at the ends of a linear move). In practice only deceleration and
+# acceleration ramps overlap; constant-velocity profiles and reversals hardly blend at all.
+def overlap(delta, displacement, radius, nextDisplacement, rate, maxVelocity=None, maxAccel=None):
+    remaining = np.max(np.abs(delta - displacement), axis=1)
+    ticks = int(np.count_nonzero(remaining <= radius))
+    ticks = min(ticks, len(displacement) // 2, len(nextDisplacement) // 2)
+    if maxVelocity is None or ticks == 0:
+        return ticks
+    zero = np.zeros(len(delta))
+    velocity, accel = peaks(zero, superimpose(delta, displacement, nextDisplacement, 0), rate)
+    velocity = np.maximum(velocity, maxVelocity) * 1.001
+    accel = np.maximum(accel, maxAccel) * 1.001
+    for n in range(ticks, 0, -1):
+        v, a = peaks(zero, superimpose(delta, displacement, nextDisplacement, n), rate)
+        if np.all(v <= velocity) and np.all(a <= accel):
+            return n
+    return 0
+
+
+# 将多个航点连成一条连续路径。每一段按 plan() 规划, 相邻两段在航点附近叠加,
+# 使机械臂以 radius 度的圆角经过航点而不停下; dwell 秒 (大于 0 时) 在航点停留。
+# radius 与 dwell 可为每个航点单独设置。
+# Join waypoints into one continuous path. Each segment is planned with plan(), and
+# neighbouring segments are superimposed near the waypoint so the arm rounds it within
+# `radius` degrees instead of stopping; a positive `dwell` (seconds) holds at the waypoint.
+# radius and dwell may be given per waypoint.
+def blend(waypoints, rate, profile='trapezoid', maxVelocity=None, maxAccel=None, radius=0.0, dwell=0.0, steps=30):
+    waypoints = np.asarray(waypoints, dtype=float)
+    count = len(waypoints)
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (count,))
+    dwell = np.rint(np.broadcast_to(np.asarray(dwell, dtype=float), (count,)) * rate).astype(int)
+    if maxVelocity is not None:
+        maxVelocity = np.broadcast_to(np.asarray(maxVelocity, dtype=float), waypoints.shape[1:])
+        maxAccel = np.broadcast_to(np.asarray(np.inf if maxAccel is None else maxAccel, dtype=float), waypoints.shape[1:])
+    segments = []
+    for k in range(0, count - 1):
+        path = plan(waypoints[k], waypoints[k + 1], rate, profile, maxVelocity, maxAccel, steps)
+        segments.append((waypoints[k + 1] - waypoints[k], path - waypoints[k]))
+    starts = []
+    length = t = 0
+    for k in range(0, len(segments)):
+        delta, displacement = segments[k]
+        starts.append(t)
+        t += len(displacement)
+        length = max(length, t)
+        t += dwell[k + 1]
+        if k + 1 < len(segments) and dwell[k + 1] == 0 and radius[k + 1] > 0:
+            t -= overlap(delta, displacement, radius[k + 1], segments[k + 1][1], rate, maxVelocity, maxAccel)
+    length = max(length, t)
+    path = np.repeat(waypoints[:1], length, axis=0)
+    for k in range(0, len(segments)):
+        delta, displacement = segments[k]
+        end = starts[k] + len(displacement)
+        path[starts[k]:end] += displacement
+        path[end:] += delta
+    return path
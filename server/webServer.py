@@ -7,25 +7,27 @@ import threading
 import RPIservo
 import os
 import socket
+import math
 import info
 
-import RPi.GPIO as GPIO
-import PCF8591 as ADC
+import hardware
+from hardware import GPIO
+import inputDevice
+import commandRegistry
+import protocol
+import telemetry
+import hardwareActor
+import inboundQueue
 
 # websocket
 import asyncio
 import websockets
 
 import json
-import app
+import collections
+import staticServer
 
 
-state_num = None
-state_mark = None
-servoD_mark = None
-joystick_mark = 1
-joystick_button_mark = 0
-
 # 舵机转动到初始位置
 # The servo turns to the initial position.
 scGear = RPIservo.ServoCtrl()
@@ -77,193 +79,223 @@ def replace_num(initial,new_num):   #Call this function to replace data in '.txt
 def ap_thread():
     os.system("sudo create_ap wlan0 eth0 Adeept_Robot 12345678")
 
-# WEB界面控制舵机
-# WEB interface to control the servo.
-def robotCtrl(command_input, response):
-    global direction_command, turn_command
-    #print(command_input)
-    if command_input == "A_add":
-        scGear.singleServo(0, 1, 1) # (servoPort, direction, speed)
-
-    elif command_input == "A_minus":
-        scGear.singleServo(0, -1, 1)
-
-    elif command_input == "AS":
-        scGear.stopWiggle()
-
-    elif command_input == "B_add":
-        scGear.singleServo(1, -1, 1) # (servoPort, direction, speed)
-
-    elif command_input == "B_minus":
-        scGear.singleServo(1, 1, 1)
-
-    elif command_input == "BS":
-        scGear.stopWiggle()
-        
-    elif command_input == "C_add":
-        scGear.singleServo(2, 1, 1) # (servoPort, direction, speed)
-    elif command_input == "C_minus":
-        scGear.singleServo(2, -1, 1)
-    elif command_input == "CS":
-        scGear.stopWiggle()
-        
-    elif command_input == "D_add":
-        scGear.singleServo(3, 1, 1) # (servoPort, direction, speed)
-    elif command_input == "D_minus":
-        scGear.singleServo(3, -1, 1)
-    elif command_input == "DS":
-        scGear.stopWiggle()
-        
-    elif command_input == "E_add":
-        scGear.singleServo(4, 1, 1) # (servoPort, direction, speed)
-    elif command_input == "E_minus":
-        scGear.singleServo(4, -1, 1)
-    elif command_input == "ES":
-        scGear.stopWiggle()
-
-    elif command_input == 'save_pos':
-        Pos = scGear.servoAngle()
-        newPos = []
-        for i in range(0, 5):
-            newPos.append(Pos[i])
-        print("save_pos:",newPos)
-        scGear.newPlanAppend(newPos)
-    
-    elif command_input == 'stop':
-        scGear.moveThreadingStop()
-
-    elif command_input == 'cerate_Plan':
-        scGear.createNewPlan()
+# WEB界面控制舵机。命令为 "名称 参数...", 通过 commands 表查找处理函数。
+# WEB interface to control the servo. A command is "name args..." and its handler is looked up in the commands table.
+commands = commandRegistry.CommandRegistry()
 
-    elif command_input == 'plan':
-        scGear.planThreadingStart()
-        scGear.angleUpdate()
+def joint(value):   # 舵机号参数 / servo ID argument
+    ID = int(value)
+    if not 0 <= ID < 16:
+        raise ValueError("servo ID out of range: %d" % ID)
+    return ID
 
-    elif command_input == 'save_Plan':
-        scGear.savePlanJson()
-        pass
-
-def configInitAngle(command_input, response):
-    pass
+def direction(value):   # 方向参数, 1 正转 -1 反转 / direction argument, 1 forward -1 reverse
+    value = int(value)
+    if value not in (1, -1):
+        raise ValueError("direction must be 1 or -1")
+    return value
 
-# 摇杆初始化
-# Joystick initialization.
-def joystickSetup():
-    ADC.setup(0X48)
-    GPIO.setmode(GPIO.BCM)	# Numbers GPIOs by physical location
-    GPIO.setup(17, GPIO.IN, pull_up_down=GPIO.PUD_UP)	# Setup Left button pin as input an pull it up
-    GPIO.setup(18, GPIO.IN, pull_up_down=GPIO.PUD_UP)	# Setup Right button pin as input an pull it up
-
-# 读取摇杆值
-# read joystick value.
-def joystick():
-    global state_num, state_mark, servoD_mark
-    L_btn = 17
-    R_btn = 18
-    state = ['home','L-pressed', 'L-up', 'L-down', 'L-left', 'L-right',\
-             'R-home','R-pressed', 'R-up', 'R-down', 'R-left', 'R-right']
-    value = None
-    if GPIO.input(L_btn) == 0:
-        value = -6
-        state_num = 1
-        servoD_mark = 1
-    elif GPIO.input(R_btn) == 0:
-        value = 6
-        state_num = 7
-        servoD_mark = 0
-    else:
-        value = 0
-        state_num = 0
-    if ADC.read(1) <= 30:  # servo A
-        value = 1 
-        state_num = 2
-    elif ADC.read(1)>= 210 :   # servo A
-        value = -1
-        state_num = 3
-
-    if ADC.read(0) >= 210:   # servo B
-        value = 2
-        state_num = 4
-    elif ADC.read(0) <= 30: 
-        value = -2
-        state_num = 5
-
-    if ADC.read(2) <= 30: # servo C
-        value = 3
-        state_num = 8
-    elif ADC.read(2)>= 210 :   # servo C
-        value = -3 
-        state_num = 9
-    
-    if servoD_mark == 1:
-        if ADC.read(3) <= 30:   # servo D
-            value = 4
-            state_num = 10
-        elif ADC.read(3) >= 210: 
-            value = -4
-            state_num = 11
-    else:
-        if ADC.read(3) <= 30:   # servo E
-            value = 5
-            state_num = 10
-        elif ADC.read(3) >= 210: 
-            value = -5
-            state_num = 11
-    if state_mark != state_num: # print state.
-        print(state[state_num])
-        state_mark = state_num
+def finite(value):   # 有限的数值参数, 不接受 nan 和 inf / finite number argument; nan and inf are refused
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("not a finite number: %s" % value)
     return value
 
-# 通过摇杆控制舵机
-# Control the servo through the joystick.
-def joystick_move_servo(value):
-    global joystick_mark, joystick_button_mark
-    if value != 0:
-        joystick_mark = 1
-    if value == 1:          # servo A
-        scGear.singleServo(0, 1, 1) # (servo_ID, direction, speed)
-        print(scGear.servoAngle())
-    elif value == -1:
-        scGear.singleServo(0, -1, 1)
-        print(scGear.servoAngle())
-    elif value == 2:        # servo B
-        scGear.singleServo(1, 1, 1)
-    elif value == -2:
-        scGear.singleServo(1, -1, 1)
-    elif value == 3:        # servo C
-        scGear.singleServo(2, 1, 1)
-    elif value == -3:
-        scGear.singleServo(2, -1, 1)
-    elif value == 4:        # servo D
-        scGear.singleServo(3, 1, 1)
-    elif value == -4:
-        scGear.singleServo(3, -1, 1)
-    elif value == 5:        # servo E
-        scGear.singleServo(4, 1, 1)
-    elif value == -5:
-        scGear.singleServo(4, -1, 1)
-    elif value == 6:
-        scGear.planThreadingStart()
-        scGear.angleUpdate()
-        joystick_button_mark = 1
-    elif value ==  -6:
-        scGear.moveThreadingStop()
-        joystick_button_mark = 0
-    else:   # servo stop
-        if joystick_mark == 1 and joystick_button_mark == 0:
-            scGear.stopWiggle()
-            joystick_mark = 0
-    
+# 舵机持续转动 / Keep turning a servo: jog <ID> <1|-1> [speed]
+@commands.command('jog', (joint, direction, finite), 2)
+def jog_command(response, ID, direct, speed=1):
+    scGear.singleServo(ID, direct, speed) # (servoPort, direction, speed)
+
+# 停止转动, 不指定舵机时全部停止 / Stop turning, all servos when no ID is given: jog_stop [ID]
+@commands.command('jog_stop', (joint,), 0)
+def jog_stop_command(response, ID=None):
+    scGear.stopWiggle(ID)
+
+# 舵机转到指定角度 / Move a servo to an absolute angle: angle <ID> <degrees>
+@commands.command('angle', (joint, finite))
+def angle_command(response, ID, angle):
+    scGear.moveJoint(ID, angle)
+
+# 所有舵机转到指定角度 / Move the servos to absolute angles: goto <angle0> [angle1 ...]
+@commands.command('goto', (finite,) * 16, 1)
+def goto_command(response, *goalPos):
+    scGear.moveToPos(len(goalPos), list(goalPos))
+
+# 流式设定值: 客户端按自己的频率发送带时间的目标角度, 服务器缓冲后按节拍插值。
+# Streamed setpoints: the client sends timestamped goal angles at its own rate; the server
+# buffers them and interpolates per tick. setpoint <t> <angle0> [angle1 ...], t in seconds on the client's clock.
+@commands.command('setpoint', (finite,) * 17, 2)
+def setpoint_command(response, t, *angles):
+    scGear.streamSetpoint(t, angles)
+
+# 播放完已收到的设定值后停止 / Stop after the buffered setpoints have been played.
+@commands.command('stream_stop')
+def stream_stop_command(response):
+    scGear.streamStop()
+
+@commands.command('get_stream_stats')
+def get_stream_stats_command(response):
+    response['title'] = 'get_stream_stats'
+    response['data'] = scGear.streamStats()
+
+@commands.command('save_pos')
+def save_pos_command(response):
+    Pos = scGear.servoAngle()
+    newPos = []
+    for i in range(0, 5):
+        newPos.append(Pos[i])
+    print("save_pos:",newPos)
+    scGear.newPlanAppend(newPos)
+
+@commands.command('stop')
+def stop_command(response):
+    scGear.moveThreadingStop()
+
+@commands.command('create_plan')
+def create_plan_command(response):
+    scGear.createNewPlan()
+
+@commands.command('plan')
+def plan_command(response):
+    scGear.planThreadingStart()
+
+@commands.command('save_plan')
+def save_plan_command(response):
+    scGear.savePlanJson()
+
+# 系统状态和舵机角度由 telemetry 统一采样, 每个订阅者收到同一个序列化好的帧。
+# System stats and servo angles are sampled once by telemetry; every subscriber gets the same serialized frame.
+def system_info():
+    return [info.get_cpu_tempfunc(), info.get_cpu_use(), info.get_ram_info()]
+
+def joint_state():
+    return list(scGear.servoAngle()[:5]), scGear.active
+
+# 命令和遥测采样中的总线与文件操作都在硬件线程中执行, 事件循环不会被阻塞。
+# Bus and file work from commands and telemetry sampling runs on the hardware thread, never on the event loop.
+hardware_actor = hardwareActor.HardwareActor()
+loop_monitor = hardwareActor.LoopMonitor()
+telemetry_publisher = telemetry.Telemetry(joint_state, system_info, actor=hardware_actor)
+
+@commands.command('get_info')
+def get_info_command(response):
+    response['title'] = 'get_info'
+    response['data'] = telemetry_publisher.info()
+
+# 订阅遥测, 每 interval 秒推送一次, 0 为取消订阅。由 recv_msg 按连接处理。
+# Subscribe to telemetry every `interval` seconds; 0 unsubscribes. recv_msg applies it to the connection.
+@commands.command('subscribe', (finite,), 0)
+def subscribe_command(response, interval=1.0):
+    if interval < 0:
+        raise ValueError("interval must not be negative")
+    response['title'] = 'subscribe'
+    response['data'] = {'interval': interval}
+
+# 事件循环延迟和硬件线程的统计 / Event loop lag and hardware thread statistics.
+@commands.command('get_loop_stats')
+def get_loop_stats_command(response):
+    response['title'] = 'get_loop_stats'
+    response['data'] = {'lag': loop_monitor.stats(), 'hardware': hardware_actor.stats()}
+
+# 遥测发布的统计 / Telemetry publisher statistics.
+@commands.command('get_telemetry_stats')
+def get_telemetry_stats_command(response):
+    response['title'] = 'get_telemetry_stats'
+    response['data'] = telemetry_publisher.stats()
+
+# 舵机角度和是否在运动 / Servo angles and whether the arm is moving.
+@commands.command('get_state')
+def get_state_command(response):
+    response['title'] = 'get_state'
+    response['data'] = {'angles': list(scGear.servoAngle()[:5]), 'moving': scGear.active}
+
+# 各命令的调用次数和处理耗时 / Calls and handler time of every command.
+@commands.command('get_command_stats')
+def get_command_stats_command(response):
+    response['title'] = 'get_command_stats'
+    response['data'] = commands.stats()
+
+# 网络摇杆 (ROBOT_INPUT=network) / Network joystick: joystick <a0> <a1> <a2> <a3>
+@commands.command('joystick', (int, int, int, int))
+def joystick_command(response, *axes):
+    if isinstance(joystick.sampler.source, inputDevice.NetworkSource):
+        joystick.sampler.source.push(axes)
+
+# 网页使用的旧命令 / Legacy commands sent by the web page.
+commands.alias('A_add', 'jog', 0, 1, 1)
+commands.alias('A_minus', 'jog', 0, -1, 1)
+commands.alias('AS', 'jog_stop', 0)
+commands.alias('B_add', 'jog', 1, -1, 1)
+commands.alias('B_minus', 'jog', 1, 1, 1)
+commands.alias('BS', 'jog_stop', 1)
+commands.alias('C_add', 'jog', 2, 1, 1)
+commands.alias('C_minus', 'jog', 2, -1, 1)
+commands.alias('CS', 'jog_stop', 2)
+commands.alias('D_add', 'jog', 3, 1, 1)
+commands.alias('D_minus', 'jog', 3, -1, 1)
+commands.alias('DS', 'jog_stop', 3)
+commands.alias('E_add', 'jog', 4, 1, 1)
+commands.alias('E_minus', 'jog', 4, -1, 1)
+commands.alias('ES', 'jog_stop', 4)
+commands.alias('cerate_Plan', 'create_plan')
+commands.alias('save_Plan', 'save_plan')
+commands.alias('unsubscribe', 'subscribe', 0)
+
+# 摇杆映射表: 左摇杆控制 A、B, 右摇杆上下控制 C, 左右控制 D 或 E (由按键切换)。
+# Joystick mapping: the left stick drives A and B, the right stick drives C up/down and
+# D or E left/right (switched by the buttons).
+joystick_layers = {
+    'E': {
+        1: inputDevice.AxisMap(0, -1, ('L-up', 'L-down')),      # servo A
+        0: inputDevice.AxisMap(1, 1, ('L-right', 'L-left')),    # servo B
+        2: inputDevice.AxisMap(2, -1, ('R-up', 'R-down')),      # servo C
+        3: inputDevice.AxisMap(4, -1, ('R-left', 'R-right')),   # servo E
+    },
+}
+joystick_layers['D'] = dict(joystick_layers['E'])
+joystick_layers['D'][3] = inputDevice.AxisMap(3, -1, ('R-left', 'R-right'))   # servo D
+
+# 左键: 中止动作, 右摇杆左右控制舵机 D。 stamp 为按下的时间。
+# Left button: abort the plan; the right stick moves servo D. stamp is the time of the press.
+def left_button(stamp):
+    joystick.layer = 'D'
+    scGear.moveThreadingStop(stamp)
+    joystick.setState('L-pressed')
+
+# 右键: 开始执行动作, 右摇杆左右控制舵机 E。
+# Right button: start the plan; the right stick moves servo E.
+def right_button(stamp):
+    joystick.layer = 'E'
+    scGear.planThreadingStart(stamp)
+    joystick.setState('R-pressed')
+
+# ROBOT_INPUT 选择摇杆输入: adc (默认), network (网页发送 "joystick a0 a1 a2 a3"),
+# 或记录文件 (ROBOT_INPUT_SPEED 倍速回放)。ROBOT_RECORD=<文件> 把摇杆样本记录下来。
+# ROBOT_INPUT selects the joystick input: adc (default), network (the web page sends
+# "joystick a0 a1 a2 a3"), or a trace file replayed at ROBOT_INPUT_SPEED.
+# ROBOT_RECORD=<file> records the joystick samples to a binary trace.
+# ROBOT_INPUT_FILTER 为每个轴的滤波参数 (JSON, 见 inputDevice.openFilters)。
+# ROBOT_INPUT_FILTER sets each axis's filter (JSON, see inputDevice.openFilters).
+joystick = inputDevice.Joystick(scGear, joystick_layers, {17: left_button, 18: right_button},
+                                inputDevice.openSource(os.environ.get('ROBOT_INPUT', 'adc'),
+                                                       float(os.environ.get('ROBOT_INPUT_SPEED', '1.0'))),
+                                filters=inputDevice.openFilters(os.environ.get('ROBOT_INPUT_FILTER', '')))
+if os.environ.get('ROBOT_RECORD'):
+    joystick.sampler.recorder = inputDevice.TraceRecorder(os.environ['ROBOT_RECORD'], (17, 18))
+
+# 采样线程以 200Hz 读取摇杆, 控制循环只处理最新的样本, 不会阻塞。
+# The sampler thread reads the joystick at 200 Hz; this loop handles only the newest sample and never blocks on it.
 def joystickControl():
-    joystickSetup()
-    while True:
-        value = joystick()
-        joystick_move_servo(value)
-        time.sleep(0.05)
+    GPIO.setmode(GPIO.BCM)	# Numbers GPIOs by physical location
+    joystick.setup()
+    joystick.start()
+    joystick.loop()
 
 # 检测树莓派是否连接到网络
 # Check if the Raspberry Pi is connected to the network.
 def WiFi_check():
+    if hardware.BACKEND == 'sim':
+        return
     try:
         s =socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
         s.connect(("1.1.1.1",80))
@@ -286,45 +318,170 @@ async def check_permit(websocket):
             response_str = "congratulation, you have connect with server\r\nnow, you can do something else"
             await websocket.send(response_str)
             return True
-async def recv_msg(websocket):
-    print("recv_msg")
+# 收到的命令: kind 为二进制请求的类型 (文本 JSON 为 None), reply 为不需执行命令的回复,
+# batch 为 JSON 数组中的命令列表。
+# A received command: kind is the binary request type (None for JSON text); reply is a ready
+# answer that needs no command (HELLO, a malformed frame); batch is the list of commands of a JSON array.
+Message = collections.namedtuple('Message', ['kind', 'name', 'args', 'reply', 'batch'], defaults=[None])
+
+# 每个连接的 inbound 队列: 每秒最多 inbound_rate 个命令, 同一舵机只执行最新的命令。
+# The inbound queue of each connection: at most inbound_rate commands per second, and only
+# the newest waiting command for a servo is run.
+inbound_rate = 50.0
+inbound_burst = 20
+inbound_size = 32
+inbound_totals = inboundQueue.InboundStats()
+
+# 合并用的键: 同一舵机的 jog 与 jog_stop 互相替换, 全部停止替换所有舵机的 jog。同一舵机的 angle
+# 只替换 angle: 它并入正在进行的移动, 与 jog 无关。积压时只保留最新的流式设定值, 中间的由插值补上。
+# The coalescing key: jog and jog_stop for one servo replace each other, and stopping all
+# servos replaces the jogs of every servo. An angle only replaces an angle for the same servo,
+# since it is merged into the running move and has nothing to do with jogging. A backlog of
+# streamed setpoints keeps only the newest; interpolation covers the gap. Returns (key, supersedes).
+def command_key(name, args):
+    name, args = commands.resolve(name, args)
+    if name in ('jog', 'jog_stop', 'angle'):
+        if name == 'jog_stop' and not args:
+            return 'joints', [('joint', ID) for ID in range(0, 16)]
+        try:
+            return ('angle' if name == 'angle' else 'joint', joint(args[0])), ()
+        except (ValueError, IndexError):
+            return None, ()
+    if name in ('goto', 'setpoint'):
+        return name, ()
+    return None, ()
+
+@commands.command('get_inbound_stats')
+def get_inbound_stats_command(response):
+    response['title'] = 'get_inbound_stats'
+    response['data'] = inbound_totals.stats()
+
+# 按连接订阅或取消订阅遥测 / Subscribe or unsubscribe this connection to telemetry.
+def subscribe(websocket, response, binary):
+    if response['status'] == 'ok' and response['title'] == 'subscribe':
+        if response['data']['interval'] > 0:
+            telemetry_publisher.subscribe(websocket, response['data']['interval'], binary)
+        else:
+            telemetry_publisher.unsubscribe(websocket)
+
+# 二进制帧按 protocol 解码, 执行同一张命令表, 回复也是二进制帧。
+# A binary frame is decoded by protocol, runs through the same command table and gets a binary reply.
+def binary_msg(frame):
+    if frame[:1] == bytes([protocol.HELLO]):
+        return Message(protocol.HELLO, None, [], protocol.hello())
+    try:
+        name, args = protocol.decode(frame)
+    except ValueError as e:
+        print("Bad frame:", e)
+        return Message(frame[0] if frame else 0, None, [], protocol.ack(frame[0] if frame else 0, protocol.ACK_ERROR))
+    return Message(frame[0], name, args, None)
+
+def text_msg(data):
+    words = data.split()
+    if not words:
+        return Message(None, None, [], None)
+    return Message(None, words[0], words[1:], None)
+
+# 执行一个命令并返回回复 / Run one command and return its reply.
+async def run_msg(websocket, message):
+    if message.reply is not None:
+        return message.reply
+    response = {
+        'status': 'ok',
+        'title': '',
+        'data': None
+    }
+    if message.batch is not None:
+        await hardware_actor.call(commands.batch, message.batch, response)
+        if isinstance(response['data'], list):
+            for result in response['data']:
+                subscribe(websocket, result, False)
+        return json.dumps(response)
+    known = message.name is not None and await hardware_actor.call(commands.run, message.name, message.args, response)
+    if message.kind is None:
+        if not known: # 与二进制协议的 ACK_UNKNOWN 一致 / matches ACK_UNKNOWN in the binary protocol
+            response['status'] = 'error'
+            response['title'] = message.name or ''
+            response['data'] = "unknown command %r" % message.name if message.name else "not a command"
+        subscribe(websocket, response, False)
+        return json.dumps(response)
+    if not known:
+        return protocol.ack(message.kind, protocol.ACK_UNKNOWN)
+    subscribe(websocket, response, True)
+    return protocol.encode(message.kind, response)
+
+# 读取消息放入队列; 队列满时不再读取, 由连接对客户端形成背压。
+# JSON 数组是一个批量: 在硬件线程中一次按顺序执行, 不与其他命令合并, 只有一个回复。
+# Read messages into the queue; while it is full nothing is read and the connection pushes back on the client.
+# A JSON array is a batch: it runs in order in one hardware thread call, is never coalesced and gets one reply.
+async def read_msg(websocket, inbound):
     while True:
-        response = {
-            'status': 'ok',
-            'title': '',
-            'data': None
-        }
-        data = ''
         data = await websocket.recv()
-        try:
-            data = json.loads(data)
-        except Exception as e:
-            print("Not A JSON")
-        
-        if not data:
-            continue
-        #print("data:", data)
-        if data != 'get_info':
-            print(data)
-        if isinstance(data, str):
-            robotCtrl(data, response)
-            configInitAngle(data, response)
-        
-        if data == "get_info":
-            response['title'] = 'get_info'
-            response['data'] = [info.get_cpu_tempfunc(), info.get_cpu_use(), info.get_ram_info()]
-
-        response = json.dumps(response)
-        await websocket.send(response)
+        if isinstance(data, bytes):
+            message = binary_msg(data)
+        else:
+            try:
+                data = json.loads(data)
+            except Exception as e:
+                print("Not A JSON")
+
+            if not data:
+                continue
+            #print("data:", data)
+            if data != 'get_info':
+                print(data)
+            if isinstance(data, str):
+                message = text_msg(data)
+            elif isinstance(data, list):
+                message = Message(None, None, [], None, data)
+            else:
+                message = Message(None, None, [], None)
+        if message.batch is not None:
+            await inbound.put(message, cost=max(1, min(len(message.batch), commands.maxBatch)))
+        elif message.name is None:
+            await inbound.put(message)
+        else:
+            await inbound.put(message, *command_key(message.name, message.args))
+
+# 按顺序执行队列中的命令并回复 / Run the queued commands in order and send the replies.
+async def process_msg(websocket, inbound):
+    while True:
+        message = await inbound.get()
+        await websocket.send(await run_msg(websocket, message))
+
+async def recv_msg(websocket):
+    print("recv_msg")
+    inbound = inboundQueue.InboundQueue(inbound_rate, inbound_burst, inbound_size, inbound_totals)
+    tasks = [asyncio.ensure_future(read_msg(websocket, inbound)), asyncio.ensure_future(process_msg(websocket, inbound))]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        inbound.close()
 
 async def main_logic(websocket, path):
-    await check_permit(websocket)
-    await recv_msg(websocket)
+    try:
+        await check_permit(websocket)
+        await recv_msg(websocket)
+    finally:
+        telemetry_publisher.unsubscribe(websocket)
+
+# /health 的内容 / Contents of /health.
+def health_info():
+    return {'moving': scGear.active, 'loopLag': loop_monitor.stats()['p99'], 'subscribers': len(telemetry_publisher.subscribers),
+            'coalesced': inbound_totals.counts['coalesced'], 'dropped': inbound_totals.counts['dropped']}
+
+# 网页、/health 和 websocket 由同一个事件循环提供, 8888 与原来 Flask 的 5000 端口相同。
+# The web page, /health and the websocket are served by one event loop; port 5000, where
+# Flask used to serve the page, is the same server as 8888.
+site = staticServer.StaticSite(health=health_info)
+server_ports = (8888, 5000)
+print('preloaded %d web assets' % site.preload())
 
 if __name__ == "__main__":
-    global flask_app
-    flask_app = app.webapp()
-    flask_app.startThread()
 
     joystickControlThreading=threading.Thread(target=joystickControl)
     joystickControlThreading.setDaemon(True)
@@ -333,8 +490,10 @@ if __name__ == "__main__":
     while True:
         WiFi_check()
         try:
-            start_server = websockets.serve(main_logic, '0.0.0.0', 8888)
-            asyncio.get_event_loop().run_until_complete(start_server)
+            for port in server_ports:
+                start_server = websockets.serve(main_logic, '0.0.0.0', port, process_request=site.process_request)
+                asyncio.get_event_loop().run_until_complete(start_server)
+            loop_monitor.start()
             print('waiting for connection...')
             break
         except Exception as e:
@@ -105,7 +105,7 @@ def fix_installation_if_needed():
             "adafruit-circuitpython-pca9685",
             "flask",
             "flask_cors",
-            "websockets",
+            "'websockets<14'",
             "psutil",
             "RPi.GPIO",
             "rpi_ws281x",
@@ -224,7 +224,7 @@ commands_1 = [
     f"{pip_cmd} mpu6050-raspberrypi",
     f"{pip_cmd} flask",
     f"{pip_cmd} flask_cors",
-    f"{pip_cmd} websockets",
+    f"{pip_cmd} 'websockets<14'",
     f"{pip_cmd} psutil",
     f"{pip_cmd} smbus",
     "sudo apt-get install -y libjasper-dev",
@@ -97,7 +97,7 @@ commands_pip_1 = [
     "sudo pip3 install mpu6050-raspberrypi",
     "sudo pip3 install flask",
     "sudo pip3 install flask_cors",
-    "sudo pip3 install websockets",
+    "sudo pip3 install 'websockets<14'",
     "sudo pip3 install adafruit-circuitpython-motor",
     "sudo pip3 install adafruit-circuitpython-pca9685"
 ]
@@ -109,7 +109,7 @@ commands_pip_2 = [
     "sudo pip3 install mpu6050-raspberrypi --break-system-packages",
     "sudo pip3 install flask --break-system-packages",
     "sudo pip3 install flask_cors --break-system-packages",
-    "sudo pip3 install websockets --break-system-packages",
+    "sudo pip3 install 'websockets<14' --break-system-packages",
     "sudo pip3 install adafruit-circuitpython-motor --break-system-packages",
     "sudo pip3 install adafruit-circuitpython-pca9685 --break-system-packages"
 ]